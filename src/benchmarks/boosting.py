@@ -0,0 +1,107 @@
+"""
+This module compares the Gradient Boosting backends of train_model on a
+feature file: the exact-split `GradientBoostingClassifier` as configured
+before the histogram backend existed, and the histogram backend with and
+without early stopping. For each it reports fit time, batch and single-row
+predict latency and test accuracy, on the train/test split of train_model.
+
+Run from the project root:
+    python -m src.benchmarks.boosting data/interim/spam_features_selected.store
+"""
+
+import click
+import json
+import logging
+import time
+from pathlib import Path
+
+# Backend settings compared, applied over params.yaml `model.gradient_boosting`
+VARIANTS = {
+    'exact': {'backend': 'exact', 'early_stopping': False},
+    'histogram': {'backend': 'histogram', 'early_stopping': False},
+    'histogram + early stopping': {'backend': 'histogram',
+                                   'early_stopping': True},
+}
+
+
+def benchmark_variant(X_train, y_train, X_test, y_test, gb_params):
+    """
+    Return fit seconds, predict latencies, accuracy and stages used of one
+    configuration.
+    """
+    import numpy as np
+
+    from src.models.train_model import predict_latency, train_model_gb
+
+    start = time.perf_counter()
+    model = train_model_gb(X_train, y_train, **gb_params)
+    fit_seconds = time.perf_counter() - start
+
+    predictions, us_per_row, single_row_ms = predict_latency(model, X_test)
+    if gb_params['backend'] == 'histogram':
+        stages = model['boosting'].n_iter_
+    else:
+        stages = model.n_estimators_
+    return {
+        'fit_seconds': fit_seconds,
+        'predict_us_per_row': us_per_row,
+        'predict_single_row_ms': single_row_ms,
+        'accuracy': float(np.mean(predictions == np.asarray(y_test))),
+        'stages': int(stages),
+    }
+
+
+@click.command()
+@click.argument('features_filepath', type=click.Path(exists=True))
+@click.option('--variant', 'variants', type=click.Choice(sorted(VARIANTS)),
+              multiple=True, default=tuple(VARIANTS), show_default=True,
+              help='Backend configuration (repeatable).')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Optional JSON file to write the results to.')
+def main(features_filepath, variants, output):
+    """
+    Compare fit time, predict latency and accuracy of the Gradient Boosting
+    backends.
+    """
+    from src.data.split import select_rows, split_indices
+    from src.data.storage import read_features
+    from src.models.train_model import load_params
+
+    logger = logging.getLogger(__name__)
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+
+    X, y, _ = read_features(features_filepath, params['data']['target_column'])
+    train_indices, test_indices = split_indices(
+        X.shape[0], params['data']['test_size'], params['data']['random_state']
+    )
+    X_train = select_rows(X, train_indices)
+    X_test = select_rows(X, test_indices)
+    y_train = select_rows(y, train_indices)
+    y_test = select_rows(y, test_indices)
+
+    results = {}
+    for variant in variants:
+        gb_params = {**params['model']['gradient_boosting'],
+                     **VARIANTS[variant]}
+        results[variant] = benchmark_variant(X_train, y_train, X_test, y_test,
+                                             gb_params)
+        r = results[variant]
+        logger.info(f'{variant:<27} fit {r["fit_seconds"]:7.2f} s '
+                    f'({r["stages"]:>3} stages) | '
+                    f'predict {r["predict_us_per_row"]:7.2f} us/row, '
+                    f'{r["predict_single_row_ms"]:6.2f} ms/call | '
+                    f'accuracy {r["accuracy"]:.4f}')
+
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump({'rows': X.shape[0], 'columns': X.shape[1],
+                       'variants': results}, f, indent=2)
+        logger.info(f'Results saved to {output}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -0,0 +1,93 @@
+"""
+This module benchmarks contraction expansion used by the data pre-processing
+stage: the single-scan engine against the sequential per-entry expansion.
+
+Run from the project root:
+    python -m src.benchmarks.contractions --sizes 10000 --sizes 1000000
+"""
+
+import click
+import logging
+import random
+import time
+
+from src.data.make_dataset import (
+    contr_words,
+    contr_words_sequential,
+    contractions,
+)
+
+
+# Plain SMS-like words mixed into the synthetic messages
+FILLER_WORDS = [
+    'free', 'call', 'now', 'txt', 'win', 'prize', 'claim', 'ok', 'lor', 'home',
+    'later', 'today', 'tomorrow', 'meet', 'urgent', 'mobile', 'cash', 'reply',
+    'stop', 'love', 'got', 'going', 'sorry', 'phone', 'week', 'night', 'good',
+]
+
+
+def make_messages(n_messages, seed=42):
+    """Generate lower-cased synthetic messages containing contractions."""
+    rnd = random.Random(seed)
+    contraction_keys = [key.lower() for key in contractions]
+    messages = []
+    for _ in range(n_messages):
+        words = rnd.choices(FILLER_WORDS, k=rnd.randint(4, 20))
+        for _ in range(rnd.randint(0, 3)):
+            words.insert(rnd.randrange(len(words) + 1),
+                         rnd.choice(contraction_keys))
+        messages.append(' '.join(words))
+    return messages
+
+
+def time_expansion(expand, messages):
+    """Return the mean seconds per message `expand` spends on `messages`."""
+    start = time.perf_counter()
+    for message in messages:
+        expand(message, contractions)
+    return (time.perf_counter() - start) / len(messages)
+
+
+@click.command()
+@click.option('--sizes', type=int, multiple=True, default=(10000, 1000000),
+              show_default=True,
+              help='Number of messages to expand (repeatable).')
+@click.option('--sequential-sample', type=int, default=20000,
+              show_default=True,
+              help='Max messages timed with the sequential expansion per '
+                   'size.')
+def main(sizes, sequential_sample):
+    """
+    Time per-message contraction expansion at several corpus sizes.
+
+    The sequential expansion is timed on at most `sequential_sample` messages
+    of each corpus, since its per-message cost does not depend on corpus size.
+    """
+    logger = logging.getLogger(__name__)
+
+    for size in sizes:
+        messages = make_messages(size)
+        sample = messages[:sequential_sample]
+
+        mismatches = sum(
+            contr_words(message, contractions)
+            != contr_words_sequential(message, contractions)
+            for message in sample
+        )
+        sequential = time_expansion(contr_words_sequential, sample)
+        single_scan = time_expansion(contr_words, messages)
+
+        logger.info(
+            f'{size:>9} messages | '
+            f'sequential {sequential * 1e6:8.2f} us/msg | '
+            f'single-scan {single_scan * 1e6:8.2f} us/msg | '
+            f'speedup {sequential / single_scan:6.1f}x | '
+            f'mismatches {mismatches}'
+        )
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -0,0 +1,195 @@
+"""
+This module generates a deterministic synthetic SMS spam/ham corpus with the
+same columns as the raw dataset, so the pipeline can be exercised at any size.
+
+Messages mix label-specific vocabularies drawn with Zipf-like frequencies,
+contractions, punctuation, mixed case, phone numbers and prices, and a share
+of repeated messages, so every pre-processing step has work to do.
+
+Run from the project root:
+    python -m src.benchmarks.corpus data/raw/synthetic.csv --rows 100000
+"""
+
+import click
+import logging
+from pathlib import Path
+
+import numpy as np
+
+
+# Processed dataset of the make_dataset stage, benchmarked instead of a
+# synthetic corpus when it exists
+PROCESSED_DATA = (Path(__file__).resolve().parents[2] / 'data' / 'processed'
+                  / 'cleaned_spam_data.csv')
+
+HAM_WORDS = [
+    'ok', 'lor', 'home', 'later', 'today', 'tomorrow', 'meet', 'love', 'got',
+    'going', 'sorry', 'night', 'good', 'come', 'time', 'know', 'like', 'want',
+    'need', 'think', 'day', 'dinner', 'pick', 'work', 'class', 'wait', 'tell',
+    'sleep', 'dear', 'haha', 'yeah', 'lunch', 'friend', 'leave', 'watch',
+    'movie', 'happy', 'birthday', 'miss', 'soon', 'babe', 'remember', 'finish',
+    'bus', 'call', 'message', 'phone', 'week', 'now', 'reply',
+]
+
+SPAM_WORDS = [
+    'free', 'call', 'now', 'txt', 'win', 'prize', 'claim', 'urgent', 'mobile',
+    'cash', 'reply', 'stop', 'award', 'guaranteed', 'winner', 'selected',
+    'offer', 'ringtone', 'tone', 'service', 'customer', 'holiday', 'voucher',
+    'bonus', 'entry', 'draw', 'contact', 'landline', 'valid', 'code', 'chat',
+    'dating', 'camera', 'video', 'network', 'subscription', 'unsubscribe',
+    'apply', 'week', 'message', 'phone', 'box', 'won', 'collect', 'rate',
+    'latest', 'update',
+]
+
+CONTRACTIONS = [
+    "i'm", "don't", "can't", "it's", "you're", "i'll", "won't", "that's",
+    "y'all",
+]
+PUNCTUATION = ['', '', '', '.', '!', '!!', '?', '...', ',']
+
+# Share of spam messages in the original SMS Spam Collection
+SPAM_RATIO = 0.134
+
+# Messages generated per batch, bounding the memory of the word draws
+BATCH_SIZE = 100000
+
+
+def _zipf_weights(n_words, exponent=1.1):
+    """Return normalized Zipf-like weights for `n_words` ranked words."""
+    weights = 1.0 / np.arange(1, n_words + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _make_batch(rng, n_rows):
+    """Generate `n_rows` (label, message) pairs with the random generator."""
+    is_spam = rng.random(n_rows) < SPAM_RATIO
+    lengths = np.where(is_spam, rng.integers(12, 30, n_rows),
+                       rng.integers(3, 20, n_rows))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    position_is_spam = np.repeat(is_spam, lengths)
+
+    ham = np.array(HAM_WORDS + CONTRACTIONS, dtype=object)
+    spam = np.array(SPAM_WORDS, dtype=object)
+    spam_draws = rng.choice(len(spam), size=offsets[-1],
+                            p=_zipf_weights(len(spam)))
+    ham_draws = rng.choice(len(ham), size=offsets[-1],
+                           p=_zipf_weights(len(ham)))
+    words = np.where(position_is_spam, spam[spam_draws], ham[ham_draws])
+
+    # Mixed case and trailing punctuation on some words
+    upper = rng.random(offsets[-1]) < 0.05
+    words[upper] = [word.upper() for word in words[upper]]
+    punctuation = np.array(PUNCTUATION, dtype=object)
+    words = words + punctuation[rng.integers(0, len(PUNCTUATION),
+                                             offsets[-1])]
+
+    numbers = rng.integers(10**9, 10**10, n_rows)
+    prices = rng.choice([100, 250, 500, 1000, 2000], n_rows)
+    has_number = rng.random(n_rows) < 0.7
+    messages = []
+    for i in range(n_rows):
+        message = ' '.join(words[offsets[i]:offsets[i + 1]])
+        if is_spam[i] and has_number[i]:
+            message += f' Call 0{numbers[i]} to claim £{prices[i]}'
+        messages.append(message[0].upper() + message[1:])
+    return np.where(is_spam, 'spam', 'ham'), messages
+
+
+def make_corpus(n_rows, seed=42, duplicate_ratio=0.05, label_noise=0.02):
+    """
+    Generate a synthetic raw SMS dataset.
+
+    The same `seed` and `n_rows` always give the same dataset.
+
+    Args:
+        n_rows (int): Number of rows
+        seed (int): Random seed
+        duplicate_ratio (float): Share of rows repeating an earlier row
+        label_noise (float): Share of messages with a flipped label, so that
+            models cannot reach a perfect score
+
+    Returns:
+        pd.DataFrame: Labels in 'v1', messages in 'v2' and the empty extra
+            columns of the raw dataset
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n_unique = max(1, n_rows - int(n_rows * duplicate_ratio))
+    labels, messages = [], []
+    for start in range(0, n_unique, BATCH_SIZE):
+        batch_labels, batch_messages = _make_batch(
+            rng, min(BATCH_SIZE, n_unique - start))
+        labels.append(batch_labels)
+        messages.extend(batch_messages)
+
+    labels = np.concatenate(labels)
+    flipped = rng.random(n_unique) < label_noise
+    labels[flipped] = np.where(labels[flipped] == 'spam', 'ham', 'spam')
+
+    df = pd.DataFrame({'v1': labels, 'v2': messages})
+    if n_rows > n_unique:
+        repeated = df.iloc[rng.integers(0, n_unique, n_rows - n_unique)]
+        df = pd.concat([df, repeated], ignore_index=True)
+        df = df.iloc[rng.permutation(n_rows)].reset_index(drop=True)
+    for column in ('Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4'):
+        df[column] = np.nan
+    return df
+
+
+def processed_corpus(size, input_filepath=None):
+    """
+    Return pre-processed messages in 'v2' and encoded labels in 'v1'.
+
+    Args:
+        size (int): Number of synthetic messages, pre-processed as
+            make_dataset does, when there is no `input_filepath`
+        input_filepath (str): Optional processed dataset written by
+            make_dataset (any format `read_frame` reads)
+
+    Returns:
+        pd.DataFrame: The 'v1' and 'v2' columns, with a RangeIndex
+    """
+    from sklearn.preprocessing import LabelEncoder
+
+    from src.data.make_dataset import UNUSED_COLUMNS, preprocessing
+    from src.data.storage import read_frame
+
+    if input_filepath is not None:
+        df = read_frame(input_filepath, columns=['v1', 'v2'])
+        df['v2'] = df['v2'].fillna('')
+        return df.reset_index(drop=True)
+
+    df = make_corpus(size).drop(UNUSED_COLUMNS, axis=1).drop_duplicates()
+    df = preprocessing(df, 'v2', tokenizer='fast').reset_index(drop=True)
+    df['v1'] = LabelEncoder().fit_transform(df['v1'])
+    return df
+
+
+@click.command()
+@click.argument('output_filepath', type=click.Path())
+@click.option('--rows', type=int, default=100000, show_default=True,
+              help='Number of rows to generate.')
+@click.option('--seed', type=int, default=42, show_default=True,
+              help='Random seed.')
+def main(output_filepath, rows, seed):
+    """
+    Write a synthetic raw dataset (CSV, Parquet or Feather, from the file
+    extension).
+    """
+    from src.data.storage import write_frame
+
+    logger = logging.getLogger(__name__)
+
+    df = make_corpus(rows, seed=seed)
+    write_frame(df, output_filepath)
+    spam_share = (df['v1'] == 'spam').mean()
+    logger.info(f'{len(df)} synthetic rows ({spam_share:.1%} spam) '
+                f'saved to {output_filepath}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
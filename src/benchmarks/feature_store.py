@@ -0,0 +1,80 @@
+"""
+This module compares how long it takes to open a feature matrix saved as a
+.npz file and as a memory-mapped .store directory, at several sizes, and how
+much resident memory opening it costs.
+
+Run from the project root:
+    python -m src.benchmarks.feature_store --rows 100000 --rows 1000000
+"""
+
+import click
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from src.benchmarks.pipeline import peak_rss_mb
+
+
+def random_features(n_rows, n_columns=4001, nnz_per_row=12, seed=42):
+    """
+    Return a random CSR feature matrix and binary labels shaped like the
+    TF-IDF features.
+    """
+    import numpy as np
+    import scipy.sparse as sp
+
+    rng = np.random.default_rng(seed)
+    X = sp.random(n_rows, n_columns, density=nnz_per_row / n_columns,
+                  format='csr', dtype=np.float32, random_state=rng)
+    return X, rng.integers(0, 2, n_rows)
+
+
+def _current_rss_mb():
+    """Return the current resident set size of this process in MiB."""
+    import psutil
+
+    return psutil.Process().memory_info().rss / 2**20
+
+
+@click.command()
+@click.option('--rows', type=int, multiple=True, default=(100000, 1000000),
+              show_default=True, help='Number of feature rows (repeatable).')
+def main(rows):
+    """Time opening .npz and .store feature files, and the memory it takes."""
+    from src.data.storage import read_features, write_features
+
+    logger = logging.getLogger(__name__)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in rows:
+            X, y = random_features(n_rows)
+            feature_names = [str(i) for i in range(X.shape[1])]
+            for suffix in ('.npz', '.store'):
+                path = Path(tmp) / f'features_{n_rows}{suffix}'
+                write_features(path, X, y, 'v1', feature_names=feature_names)
+
+                rss_before = _current_rss_mb()
+                start = time.perf_counter()
+                loaded, labels, _ = read_features(path, 'v1')
+                open_seconds = time.perf_counter() - start
+                rss_opened = _current_rss_mb() - rss_before
+
+                start = time.perf_counter()
+                total = float(loaded.sum())
+                scan_seconds = time.perf_counter() - start
+                logger.info(
+                    f'{n_rows:>9} rows | {suffix:<6} '
+                    f'open {open_seconds * 1e3:9.2f} ms '
+                    f'(+{rss_opened:7.1f} MiB) | '
+                    f'first scan {scan_seconds * 1e3:8.2f} ms | '
+                    f'peak RSS {peak_rss_mb():7.0f} MiB | checksum {total:.1f}'
+                )
+                del loaded, labels
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -0,0 +1,112 @@
+"""
+This module tracks the startup latency of the pipeline stage commands: the
+cumulative import time reported by `python -X importtime` and the wall time
+of `python -m <stage> --help`.
+
+Run from the project root:
+    python -m src.benchmarks.import_time --output reports/import_time.json
+"""
+
+import click
+import json
+import logging
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+STAGE_MODULES = [
+    'src.data.make_dataset',
+    'src.features.build_features',
+    'src.models.train_model',
+    'src.models.predict_model',
+    'src.visualization.visualize',
+]
+
+
+def import_time_us(module):
+    """
+    Import `module` in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        tuple: (cumulative, top) where cumulative is the import time of
+            `module` in microseconds and top lists the 5 slowest top-level
+            packages it pulled in as (package, microseconds) pairs
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+    )
+    cumulative = 0
+    subtree = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Entries are printed after their dependencies; top-level ones are
+        # indented by one space
+        if not name.startswith('  '):
+            if name.strip() == module:
+                cumulative = int(cumulative_us)
+                break
+            subtree = []
+        else:
+            subtree.append((name.strip(), int(cumulative_us)))
+
+    packages = {}
+    for name, cumulative_us in subtree:
+        package = name.split('.')[0]
+        if package != 'src':
+            packages[package] = max(packages.get(package, 0), cumulative_us)
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:5]
+    return cumulative, top
+
+
+def help_wall_time(module, repeat=3):
+    """
+    Return the best wall time in seconds of `python -m module --help` over
+    `repeat` runs.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', module, '--help'],
+                       capture_output=True, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Optional JSON file to write the results to.')
+@click.option('--repeat', type=int, default=3, show_default=True,
+              help='Number of --help runs per stage (best is reported).')
+def main(output, repeat):
+    """Measure import time and --help latency of every stage command."""
+    logger = logging.getLogger(__name__)
+
+    results = {}
+    for module in STAGE_MODULES:
+        cumulative, top = import_time_us(module)
+        wall = help_wall_time(module, repeat=repeat)
+        results[module] = {'import_us': cumulative, 'help_seconds': wall,
+                           'slowest_imports_us': top}
+        logger.info(
+            f'{module:<30} import {cumulative / 1e3:8.1f} ms | '
+            f'--help {wall * 1e3:8.1f} ms | '
+            f'slowest: {", ".join(name for name, _ in top)}'
+        )
+
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f'Results saved to {output}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
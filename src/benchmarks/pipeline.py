@@ -0,0 +1,190 @@
+"""
+This module benchmarks the pipeline stage functions on synthetic corpora of
+increasing size: `preprocessing`, the feature stage (`create_sparse_features`
+or the dense `create_tfidf_features`), `train_model_rf` and `make_predictions`.
+
+Every corpus size runs in a fresh process, so the reported peak RSS only
+reflects that size. Results are written as JSON and markdown.
+
+Run from the project root:
+    python -m src.benchmarks.pipeline --sizes 5000 --sizes 50000 \
+        --output-dir reports/benchmarks
+"""
+
+import click
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+STAGES = ['preprocessing', 'features', 'train_model_rf', 'make_predictions']
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of the current process in MiB."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _timed(stage, n_rows, results, func, *args, **kwargs):
+    """Call `func`, recording its wall time, throughput and peak RSS so far."""
+    start = time.perf_counter()
+    output = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    results[stage] = {
+        'rows': n_rows,
+        'seconds': seconds,
+        'rows_per_second': n_rows / seconds if seconds else float('inf'),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    return output
+
+
+def benchmark_size(size, seed=42, tokenizer='nltk', features='sparse'):
+    """
+    Run every pipeline stage on a synthetic corpus of `size` rows.
+
+    Stages are chained the way the pipeline chains them: de-duplicated rows
+    are pre-processed and label-encoded, featurized, split with the
+    parameters of params.yaml, then used to train and evaluate the model.
+    `features` is 'sparse' (CSR matrix) or 'dense' (dataframe).
+
+    Returns:
+        dict: Per-stage rows, seconds, rows per second and peak RSS in MiB
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    from src.benchmarks.corpus import make_corpus
+    from src.data.make_dataset import UNUSED_COLUMNS, preprocessing
+    from src.features.build_features import (
+        create_sparse_features,
+        create_tfidf_features,
+    )
+    from src.models.predict_model import make_predictions
+    from src.models.train_model import load_params, train_model_rf
+
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+    target_column = params['data']['target_column']
+    results = {}
+
+    df = make_corpus(size, seed=seed).drop(UNUSED_COLUMNS, axis=1)
+    df = df.drop_duplicates()
+    df = _timed('preprocessing', len(df), results, preprocessing, df, 'v2',
+                tokenizer=tokenizer)
+    df['v1'] = LabelEncoder().fit_transform(df['v1'])
+    # The feature stage reads the processed data back with a fresh RangeIndex
+    df = df.reset_index(drop=True)
+
+    if features == 'sparse':
+        X, y, _, _ = _timed('features', len(df), results,
+                            create_sparse_features, df, tokenizer=tokenizer,
+                            target_column=target_column)
+    else:
+        final_df, _ = _timed('features', len(df), results,
+                             create_tfidf_features, df, tokenizer=tokenizer)
+        X = final_df.drop([target_column], axis=1)
+        y = final_df[target_column].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y,
+        test_size=params['data']['test_size'],
+        random_state=params['data']['random_state']
+    )
+    rf_params = params['model']['random_forest']
+    model = _timed('train_model_rf', X_train.shape[0], results,
+                   train_model_rf, X_train, y_train,
+                   n_estimators=rf_params['n_estimators'],
+                   random_state=rf_params['random_state'],
+                   max_depth=rf_params['max_depth'],
+                   n_jobs=rf_params['n_jobs'])
+
+    predictions = _timed('make_predictions', X_test.shape[0], results,
+                         make_predictions, model, X_test)
+    results['accuracy'] = float((predictions == y_test).mean())
+    return results
+
+
+def markdown_report(report):
+    """Render benchmark results as a markdown table."""
+    lines = [
+        '# Pipeline benchmark',
+        '',
+        f'Tokenizer: `{report["tokenizer"]}`, '
+        f'features: `{report["features"]}`, seed: {report["seed"]}',
+        '',
+        '| corpus rows | stage | rows | seconds | rows/s | peak RSS (MiB) |',
+        '|---:|---|---:|---:|---:|---:|',
+    ]
+    for size, results in report['sizes'].items():
+        for stage in STAGES:
+            r = results[stage]
+            lines.append(f'| {size} | {stage} | {r["rows"]} | '
+                         f'{r["seconds"]:.3f} | {r["rows_per_second"]:.0f} | '
+                         f'{r["peak_rss_mb"]:.0f} |')
+    lines.append('')
+    lines.append('| corpus rows | accuracy |')
+    lines.append('|---:|---:|')
+    for size, results in report['sizes'].items():
+        lines.append(f'| {size} | {results["accuracy"]:.4f} |')
+    return '\n'.join(lines) + '\n'
+
+
+@click.command()
+@click.option('--sizes', type=int, multiple=True,
+              default=(5000, 20000, 50000), show_default=True,
+              help='Synthetic corpus sizes in rows (repeatable); anything '
+                   'from 5k to 5M.')
+@click.option('--seed', type=int, default=42, show_default=True,
+              help='Seed of the synthetic corpus.')
+@click.option('--tokenizer', type=click.Choice(['fast', 'nltk']),
+              default='nltk', show_default=True,
+              help='Tokenizer mode of pre-processing and word counts.')
+@click.option('--features', type=click.Choice(['sparse', 'dense']),
+              default='sparse', show_default=True,
+              help='Feature matrix layout of the feature stage.')
+@click.option('--output-dir', type=click.Path(file_okay=False),
+              default='reports/benchmarks', show_default=True,
+              help='Directory of pipeline.json and pipeline.md.')
+def main(sizes, seed, tokenizer, features, output_dir):
+    """Time every pipeline stage at several synthetic corpus sizes."""
+    logger = logging.getLogger(__name__)
+
+    report = {'seed': seed, 'tokenizer': tokenizer, 'features': features,
+              'sizes': {}}
+    for size in sizes:
+        logger.info(f'Benchmarking {size} rows')
+        # A fresh process per size, so that peak RSS is not carried over
+        spawn = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            results = executor.submit(benchmark_size, size, seed, tokenizer,
+                                      features).result()
+        report['sizes'][str(size)] = results
+        for stage in STAGES:
+            r = results[stage]
+            logger.info(f'{size:>9} | {stage:<22} {r["seconds"]:9.3f} s | '
+                        f'{r["rows_per_second"]:11.0f} rows/s | '
+                        f'peak RSS {r["peak_rss_mb"]:8.0f} MiB')
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    with open(output_path / 'pipeline.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    (output_path / 'pipeline.md').write_text(markdown_report(report))
+    logger.info(f'Report saved to {output_path}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
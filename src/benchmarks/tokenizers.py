@@ -0,0 +1,121 @@
+"""
+This module checks that the fast tokenizer mode gives the same output as the
+NLTK (punkt + Treebank) tokenizer and compares their throughput.
+
+Run from the project root:
+    python -m src.benchmarks.tokenizers --size 100000
+"""
+
+import click
+import logging
+import time
+
+import pandas as pd
+from nltk.tokenize import word_tokenize
+
+from src.benchmarks.contractions import make_messages
+from src.data.make_dataset import fast_tokenize, preprocess_series
+from src.features.build_features import WORD_COUNTERS
+
+
+# Messages exercising the cases where word_tokenize does more than split on
+# whitespace
+EDGE_CASES = [
+    '',
+    '   ',
+    'I cannot come, gonna be late!! wanna meet?',
+    'CANNOT Gonna GOTTA lemme gimme WANNA',
+    'cannotx xcannot cannot_ 2cannot wannabe',
+    'gımme the KEYS',
+    'Call 09061701461. Claim code KL341. Valid 12hrs only',
+    "Ok lar... Joking wif u oni... can't've y'all'd've",
+    'tab\tseparated\nnew line\r\nwindows',
+    'unicode: café naïve straße ẞig İstanbul',
+    '£1000 cash!! <b>free</b> http://spam.example/win?id=1&x=2',
+    'under_score __init__ 3.14 1,000,000',
+]
+
+
+def check_parity(messages):
+    """
+    Compare the NLTK and fast tokenizer modes on `messages`.
+
+    Returns:
+        dict: Number of mismatching messages for tokens of the cleaned text,
+            for the full pre-processing output and for word counts
+    """
+    cleaned = (pd.Series(messages).str.lower()
+               .str.replace(r'[^\w\s]', '', regex=True))
+    token_mismatches = sum(word_tokenize(text) != fast_tokenize(text)
+                           for text in cleaned)
+
+    processed = preprocess_series(pd.Series(messages), tokenizer='nltk')
+    processed_fast = preprocess_series(pd.Series(messages), tokenizer='fast')
+    output_mismatches = int((processed != processed_fast).sum())
+
+    count_mismatches = sum(
+        WORD_COUNTERS['nltk'](text) != WORD_COUNTERS['fast'](text)
+        for text in processed
+    )
+    return {
+        'tokens': token_mismatches,
+        'preprocessing': output_mismatches,
+        'word_counts': count_mismatches,
+    }
+
+
+def time_preprocessing(messages, tokenizer):
+    """Return messages per second pre-processed with a tokenizer mode."""
+    series = pd.Series(messages)
+    start = time.perf_counter()
+    preprocess_series(series, tokenizer=tokenizer)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def time_word_count(texts, tokenizer):
+    """Return messages per second whose words a tokenizer mode counts."""
+    count = WORD_COUNTERS[tokenizer]
+    start = time.perf_counter()
+    for text in texts:
+        count(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option('--size', type=int, default=100000, show_default=True,
+              help='Number of synthetic messages.')
+def main(size):
+    """
+    Check parity of the fast tokenizer mode and benchmark both modes.
+
+    Exits with an error if any message tokenizes differently.
+    """
+    logger = logging.getLogger(__name__)
+
+    messages = EDGE_CASES + [
+        message.replace('free', 'FREE!!').replace('call', 'Call, cannot')
+        for message in make_messages(size)
+    ]
+
+    mismatches = check_parity(messages)
+    logger.info(f'Parity on {len(messages)} messages: {mismatches}')
+
+    processed = list(preprocess_series(pd.Series(messages), tokenizer='fast'))
+    for tokenizer in ('nltk', 'fast'):
+        preprocessing_rate = time_preprocessing(messages, tokenizer)
+        word_count_rate = time_word_count(processed, tokenizer)
+        logger.info(
+            f'{tokenizer:>4}: pre-processing '
+            f'{preprocessing_rate:10.0f} msg/s | '
+            f'word count {word_count_rate:10.0f} msg/s'
+        )
+
+    if any(mismatches.values()):
+        raise click.ClickException(f'Tokenizer modes disagree: {mismatches}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
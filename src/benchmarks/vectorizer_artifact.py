@@ -0,0 +1,135 @@
+"""
+This module compares the pickled TF-IDF vectorizer saved by build_features
+with its compact .npz export: file size, load time in a fresh interpreter
+(imports included, as a serving process would pay them) and transform
+throughput, and checks that both produce the same matrix.
+
+The vectorizer is fitted on the processed dataset of the make_dataset stage
+when it exists (or is given with --input), otherwise on a synthetic corpus
+of --size messages.
+
+Run from the project root:
+    python -m src.benchmarks.vectorizer_artifact --size 100000
+"""
+
+import click
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Timed in a fresh interpreter: imports, then loading the artifact
+LOAD_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+from src.features.slim_vectorizer import load_vectorizer
+load_vectorizer(sys.argv[1])
+print(time.perf_counter() - start)
+'''
+
+
+def cold_load_seconds(path, repeats=5):
+    """
+    Return the best time of `repeats` fresh interpreters importing and
+    loading `path`.
+    """
+    project_dir = Path(__file__).resolve().parents[2]
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, '-c', LOAD_SCRIPT, str(path)], cwd=project_dir,
+            capture_output=True, text=True, check=True)
+        times.append(float(result.stdout))
+    return min(times)
+
+
+@click.command()
+@click.option('--input', 'input_filepath',
+              type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Processed dataset written by make_dataset; defaults to '
+                   'data/processed/cleaned_spam_data.csv when it exists.')
+@click.option('--size', type=int, default=100000, show_default=True,
+              help='Number of synthetic messages the vectorizer is fitted '
+                   'on, without a processed dataset.')
+@click.option('--repeats', type=int, default=5, show_default=True,
+              help='Fresh interpreters per load time measurement.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Optional JSON file to write the results to.')
+def main(input_filepath, size, repeats, output):
+    """Compare size, load time and transform speed of the two artifacts."""
+    import joblib
+
+    from src.benchmarks.corpus import PROCESSED_DATA, processed_corpus
+    from src.features.build_features import create_sparse_features
+    from src.features.slim_vectorizer import (export_slim_vectorizer,
+                                              load_vectorizer)
+    from src.models.train_model import load_params
+
+    logger = logging.getLogger(__name__)
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+
+    if input_filepath is None and PROCESSED_DATA.exists():
+        input_filepath = PROCESSED_DATA
+    df = processed_corpus(size, input_filepath)
+    logger.info(f'Fitting the vectorizer on {len(df)} messages of '
+                f'{input_filepath or "a synthetic corpus"}')
+    texts = df['v2'].astype(str).tolist()
+    _, _, _, vectorizer = create_sparse_features(
+        df, max_features=params['features']['max_features'],
+        tokenizer='fast')
+
+    results = {}
+    matrices = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            'joblib': Path(tmp) / 'tfidf_vectorizer.joblib',
+            'slim': Path(tmp) / 'tfidf_vectorizer.npz',
+        }
+        joblib.dump(vectorizer, paths['joblib'])
+        export_slim_vectorizer(vectorizer, paths['slim'])
+
+        for artifact, path in paths.items():
+            loaded = load_vectorizer(path)
+            start = time.perf_counter()
+            matrices[artifact] = loaded.transform(texts)
+            transform_seconds = time.perf_counter() - start
+            results[artifact] = {
+                'bytes': path.stat().st_size,
+                'cold_load_seconds': cold_load_seconds(path, repeats),
+                'rows_per_second': len(texts) / transform_seconds,
+            }
+            result = results[artifact]
+            logger.info(f'{artifact:<7} {result["bytes"] / 1024:8.0f} KiB | '
+                        'cold load '
+                        f'{result["cold_load_seconds"] * 1e3:7.1f} ms | '
+                        f'transform {result["rows_per_second"]:9.0f} rows/s')
+
+    same_pattern = (
+        (matrices['joblib'] != 0) != (matrices['slim'] != 0)).nnz == 0
+    mismatch = float(abs(matrices['joblib'] - matrices['slim']).max())
+    logger.info(f'{len(vectorizer.vocabulary_)} terms | '
+                f'same non-zeros: {same_pattern} | '
+                f'max difference {mismatch:.1e} (float32 IDF weights)')
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump({'input': str(input_filepath or 'synthetic'),
+                       'rows': len(texts),
+                       'terms': len(vectorizer.vocabulary_),
+                       'max_difference': mismatch, 'artifacts': results},
+                      f, indent=2)
+        logger.info(f'Results saved to {output}')
+
+    if not same_pattern or mismatch > 1e-6:
+        raise click.ClickException(
+            'The compact vectorizer does not reproduce the pickled one')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -0,0 +1,172 @@
+"""
+This module compares the feature modes of build_features on an SMS corpus:
+the fitted TF-IDF vocabulary (serial and map-reduce fit) against the
+stateless hashed term space (serial and with parallel chunks). For each mode
+it reports featurization throughput and the test accuracy of the Random
+Forest trained on it.
+
+The processed dataset of the make_dataset stage is used when it exists
+(or is given with --input); otherwise a synthetic corpus of --size messages.
+
+Run from the project root:
+    python -m src.benchmarks.vectorizers --size 100000 --workers 4
+"""
+
+import click
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def _chunks(df, chunksize):
+    """Yield consecutive row chunks of `df`."""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def evaluate_features(X, y, params):
+    """
+    Return the test accuracy and training seconds of the Random Forest on
+    features `X`.
+    """
+    from sklearn.model_selection import train_test_split
+
+    from src.models.train_model import train_model_rf
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=params['data']['test_size'],
+        random_state=params['data']['random_state']
+    )
+    rf_params = params['model']['random_forest']
+    start = time.perf_counter()
+    model = train_model_rf(X_train, y_train,
+                           n_estimators=rf_params['n_estimators'],
+                           random_state=rf_params['random_state'],
+                           max_depth=rf_params['max_depth'],
+                           n_jobs=rf_params['n_jobs'])
+    train_seconds = time.perf_counter() - start
+    return float((model.predict(X_test) == y_test).mean()), train_seconds
+
+
+@click.command()
+@click.option('--input', 'input_filepath',
+              type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Processed dataset written by make_dataset; defaults to '
+                   'data/processed/cleaned_spam_data.csv when it exists.')
+@click.option('--size', type=int, default=100000, show_default=True,
+              help='Number of synthetic messages, without a processed '
+                   'dataset.')
+@click.option('--workers', type=int, default=4, show_default=True,
+              help='Processes of the parallel TF-IDF and hashing runs.')
+@click.option('--n-features', type=int, default=4096, show_default=True,
+              help='Hashed term columns.')
+@click.option('--chunksize', type=int, default=10000, show_default=True,
+              help='Rows per hashed chunk.')
+@click.option('--analyzer', type=click.Choice(['regex', 'pretokenized']),
+              default='regex', show_default=True,
+              help='Term extraction of every mode.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Optional JSON file to write the results to.')
+def main(input_filepath, size, workers, n_features, chunksize, analyzer,
+         output):
+    """
+    Compare featurization throughput and model accuracy of the feature modes.
+
+    Exits with an error if a parallel run differs from the serial one.
+    """
+    import numpy as np
+
+    from src.benchmarks.corpus import PROCESSED_DATA, processed_corpus
+    from src.features.build_features import (create_hashed_features,
+                                             create_sparse_features)
+    from src.models.train_model import load_params
+
+    logger = logging.getLogger(__name__)
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+
+    if input_filepath is None and PROCESSED_DATA.exists():
+        input_filepath = PROCESSED_DATA
+    df = processed_corpus(size, input_filepath)
+    logger.info(f'Benchmarking on {len(df)} messages of '
+                f'{input_filepath or "a synthetic corpus"}')
+
+    max_features = params['features']['max_features']
+    modes = {
+        'tfidf': lambda: create_sparse_features(
+            df.copy(), max_features=max_features, tokenizer='fast',
+            analyzer=analyzer),
+        'hashing': lambda: create_hashed_features(
+            _chunks(df, chunksize), n_features=n_features, tokenizer='fast',
+            analyzer=analyzer),
+    }
+
+    def tfidf_parallel():
+        with ProcessPoolExecutor(workers) as executor:
+            return create_sparse_features(
+                df.copy(), max_features=max_features, tokenizer='fast',
+                executor=executor, n_shards=workers, analyzer=analyzer)
+
+    def hashing_parallel():
+        with ProcessPoolExecutor(workers) as executor:
+            return create_hashed_features(
+                _chunks(df, chunksize), n_features=n_features,
+                tokenizer='fast', executor=executor, analyzer=analyzer)
+
+    modes[f'tfidf x{workers}'] = tfidf_parallel
+    modes[f'hashing x{workers}'] = hashing_parallel
+
+    results = {}
+    matrices = {}
+    vectorizers = {}
+    for mode, featurize in modes.items():
+        start = time.perf_counter()
+        X, y, _, vectorizer = featurize()
+        seconds = time.perf_counter() - start
+        matrices[mode] = X
+        vectorizers[mode] = vectorizer
+        accuracy, train_seconds = evaluate_features(X, y, params)
+        results[mode] = {
+            'seconds': seconds,
+            'rows_per_second': len(df) / seconds,
+            'columns': X.shape[1],
+            'nnz': int(X.nnz),
+            'accuracy': accuracy,
+            'train_seconds': train_seconds,
+        }
+        logger.info(f'{mode:<12} {len(df) / seconds:10.0f} rows/s | '
+                    f'{X.shape[1]:7d} columns | accuracy {accuracy:.4f} | '
+                    f'RF fit {train_seconds:6.2f} s')
+
+    serial, parallel = vectorizers['tfidf'], vectorizers[f'tfidf x{workers}']
+    same_fit = (serial.vocabulary_ == parallel.vocabulary_
+                and np.array_equal(serial.idf_, parallel.idf_))
+    # Rows are L2-normalized in a different summation order: allow 1 ulp
+    tfidf_mismatch = abs(
+        matrices['tfidf'] - matrices[f'tfidf x{workers}']).max()
+    hashing_mismatch = abs(
+        matrices['hashing'] - matrices[f'hashing x{workers}']).max()
+    logger.info(f'Parallel TF-IDF fit identical: {same_fit}, '
+                f'max feature difference {tfidf_mismatch:.1e}')
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump({'input': str(input_filepath or 'synthetic'),
+                       'rows': len(df), 'analyzer': analyzer,
+                       'modes': results}, f, indent=2)
+        logger.info(f'Results saved to {output}')
+
+    if not same_fit or tfidf_mismatch > 1e-12:
+        raise click.ClickException(
+            'Parallel TF-IDF fit differs from the serial fit')
+    if hashing_mismatch != 0:
+        raise click.ClickException('Parallel hashing differs from the serial '
+                                   f'run by {hashing_mismatch}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -6,22 +6,39 @@ import click
 import logging
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
-import pandas as pd
-import numpy as np
-import nltk
-from nltk.stem import PorterStemmer
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 import re
-from sklearn.preprocessing import LabelEncoder
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from src.data.preprocess_cache import (cache_get_many, cache_keys,
+                                       cache_put_many, open_cache)
+from src.data.stopword_list import ENGLISH_STOPWORDS
+from src.data.storage import (frame_writer, iter_frame_chunks, read_frame,
+                              write_frame)
 
+# pandas, NLTK and scikit-learn are imported where they are first used, so
+# that importing this module (e.g. for --help) stays fast.
 
-# nltk.download('stopwords')
 # nltk.download('punkt')
-english_stopwords = set(stopwords.words('english'))
+english_stopwords = set(ENGLISH_STOPWORDS)
 
 #++++++++++++++++++++++++++++++ Pre-Processing [Start] ++++++++++++++++++++++++++++++#
-ps = PorterStemmer()
+
+
+@lru_cache(maxsize=None)
+def get_stemmer():
+    """Return the shared PorterStemmer, importing NLTK on first use."""
+    from nltk.stem import PorterStemmer
+    return PorterStemmer()
+
+
+def word_tokenize(text):
+    """NLTK's `word_tokenize`, importing NLTK on first use."""
+    from nltk.tokenize import word_tokenize
+    return word_tokenize(text)
+
 
 contractions = { 
 "ain't": "am not / are not / is not / has not / have not",
@@ -144,13 +161,86 @@ contractions = {
 }
 
 
-def contr_words(text, contractions_dict):
+# Upper bound on memoized word-run expansions kept per contraction engine
+CONTRACTION_LOOKUP_LIMIT = 100000
+
+_contraction_engines = {}
+
+
+def contr_words_sequential(text, contractions_dict):
+    """
+    Expand contractions one dictionary entry at a time (reference
+    implementation).
+    """
     text = str(text)
     for contraction, expansion in contractions_dict.items():
         text = re.sub(r'\b' + re.escape(contraction) + r'\b', expansion, text, flags=re.IGNORECASE)
     return text
 
 
+def build_contraction_engine(contractions_dict):
+    """
+    Compile a contraction dictionary into a single-scan expansion engine.
+
+    Every contraction is a run of letters and apostrophes that contains at
+    least one apostrophe, so the sequential expansion of a message only ever
+    rewrites runs of word characters and apostrophes that hold an apostrophe,
+    and the result for such a run does not depend on the text around it. The
+    engine therefore scans a message once for those runs and replaces each of
+    them through a lookup table holding its sequential expansion. This keeps
+    the output identical to `contr_words_sequential`, including entries that
+    overlap like "can't" / "can't've".
+
+    Args:
+        contractions_dict (dict): Mapping of contraction to its expansion
+
+    Returns:
+        tuple: (pattern, lookup) where:
+            - pattern (re.Pattern): Compiled pattern matching
+              apostrophe-bearing word runs
+            - lookup (dict): Run -> expansion table, seeded with the
+              dictionary keys
+    """
+    pattern = re.compile(r"(?<![\w'])[\w']*'[\w']*")
+
+    lookup = {}
+    for contraction in contractions_dict:
+        for run in (contraction, contraction.lower()):
+            lookup[run] = contr_words_sequential(run, contractions_dict)
+    return pattern, lookup
+
+
+def _contraction_engine(contractions_dict):
+    """
+    Return the cached (dict, substitute, expand) engine for a contraction
+    dictionary.
+    """
+    engine = _contraction_engines.get(id(contractions_dict))
+    if engine is not None and engine[0] is contractions_dict:
+        return engine
+
+    pattern, lookup = build_contraction_engine(contractions_dict)
+
+    def expand(match):
+        run = match.group()
+        expansion = lookup.get(run)
+        if expansion is None:
+            expansion = contr_words_sequential(run, contractions_dict)
+            if len(lookup) < CONTRACTION_LOOKUP_LIMIT:
+                lookup[run] = expansion
+        return expansion
+
+    engine = (contractions_dict, pattern.sub, expand)
+    _contraction_engines[id(contractions_dict)] = engine
+    return engine
+
+
+def contr_words(text, contractions_dict):
+    """Expand all contractions of `contractions_dict` in `text` in one scan."""
+    _, substitute, expand = _contraction_engine(contractions_dict)
+    return substitute(expand, str(text))
+
+
 def remove_stopwords(text):
     tokens = word_tokenize(text.lower())  
     tokens_wo_stopwords = [word for word in tokens if word not in english_stopwords] 
@@ -159,47 +249,537 @@ def remove_stopwords(text):
 
 def stem_text(text):
     words = str(text).lower().split()
-    stemmed_words = [ps.stem(word) for word in words]
+    stem = get_stemmer().stem
+    stemmed_words = [stem(word) for word in words]
     return ' '.join(stemmed_words)
 
-def preprocessing(df, col):
-    df[col] = df[col].str.lower() # lower case
-    df[col] = df[col].apply(lambda x: contr_words(x, contractions)) # decontraction
-    df[col] = df[col].str.replace(r'[^\w\s]', '', regex=True)# remove special characters
-    df[col] = df[col].apply(remove_stopwords) # remove stopwords
-    df[col] = df[col].apply(stem_text) # stemming
 
+# Upper bound on distinct tokens kept in the token -> stem table
+TOKEN_TABLE_LIMIT = 500000
+
+# Token -> stem table shared by stopword removal and stemming; stopwords map
+# to ''
+token_table = dict.fromkeys(english_stopwords, '')
+
+# Token table usage counters, reported by `main`
+token_table_stats = {'lookups': 0, 'misses': 0}
+
+
+def stem_token(token):
+    """Return the stem of `token` ('' for stopwords), memoized per process."""
+    stem = token_table.get(token)
+    if stem is None:
+        token_table_stats['misses'] += 1
+        stem = get_stemmer().stem(token.lower())
+        if len(token_table) < TOKEN_TABLE_LIMIT:
+            token_table[token] = stem
+    return stem
+
+
+def stem_tokens(tokens):
+    """
+    Drop stopwords from `tokens` and stem the rest with one table lookup per
+    token.
+    """
+    token_table_stats['lookups'] += len(tokens)
+    get = token_table.get
+    stems = []
+    for token in tokens:
+        stem = get(token)
+        if stem is None:
+            stem = stem_token(token)
+        if stem:
+            stems.append(stem)
+    return stems
+
+
+def remove_stopwords_and_stem(text):
+    """
+    Remove stopwords and stem the remaining words with one table lookup per
+    token.
+
+    Equivalent to `stem_text(remove_stopwords(text))`, but every distinct
+    token is stemmed only once per process.
+    """
+    return ' '.join(stem_tokens(word_tokenize(text.lower())))
+
+
+# Words made only of word characters that NLTK's word_tokenize still splits
+# in two
+_treebank_splits = re.compile(
+    r'(?i)(can)(not)|(gim)(me)|(gon)(na)|(got)(ta)|(lem)(me)|(wan)(na)')
+
+
+def fast_tokenize(text):
+    """
+    Tokenize text holding only word characters and whitespace.
+
+    Gives the same tokens as NLTK's `word_tokenize` for such text (as left
+    by the special character removal step) without sentence splitting or
+    the Treebank punctuation rules: the text is split on whitespace and the
+    few words the Treebank tokenizer splits ("cannot", "gonna", ...) are
+    split the same way.
+    """
+    tokens = text.split()
+    if _treebank_splits.search(text) is None:
+        return tokens
+
+    split_tokens = []
+    for token in tokens:
+        match = _treebank_splits.fullmatch(token)
+        if match is None:
+            split_tokens.append(token)
+        else:
+            split_tokens.extend(part for part in match.groups()
+                                if part is not None)
+    return split_tokens
+
+
+def remove_stopwords_and_stem_fast(text):
+    """
+    Same as `remove_stopwords_and_stem`, tokenizing once with
+    `fast_tokenize`.
+    """
+    return ' '.join(stem_tokens(fast_tokenize(text.lower())))
+
+
+# Stopword removal and stemming step for each tokenizer mode
+TOKENIZERS = {
+    'nltk': remove_stopwords_and_stem,
+    'fast': remove_stopwords_and_stem_fast,
+}
+
+
+# Number of chunks handed to each worker process when pre-processing in
+# parallel
+CHUNKS_PER_WORKER = 4
+
+# Bump when a pre-processing step changes in a way
+# `preprocessing_config_version` does not capture
+PREPROCESSING_VERSION = 1
+
+# Pre-processing cache usage counters, reported by `main`
+cache_stats = {'hits': 0, 'misses': 0}
+
+
+def preprocessing_config_version():
+    """
+    Return a hash of the config that determines pre-processing output (cache
+    namespace).
+    """
+    import nltk
+
+    ps = get_stemmer()
+    config = {
+        'version': PREPROCESSING_VERSION,
+        'contractions': list(contractions.items()),
+        'stopwords': sorted(english_stopwords),
+        'stemmer': [type(ps).__name__, ps.mode, nltk.__version__],
+    }
+    return hashlib.sha256(json.dumps(config).encode()).hexdigest()[:16]
+
+
+def preprocess_series(series, tokenizer='nltk'):
+    """
+    Run the full pre-processing chain over a Series of raw messages.
+
+    Args:
+        series (pd.Series): Raw messages
+        tokenizer (str): 'nltk' to tokenize with `word_tokenize`, or 'fast' to
+            tokenize once with `fast_tokenize`; both give the same output
+
+    Returns:
+        pd.Series: Pre-processed messages
+    """
+    series = series.str.lower()  # lower case
+    series = series.apply(contr_words, args=(contractions,))  # decontraction
+    # remove special characters
+    series = series.str.replace(r'[^\w\s]', '', regex=True)
+    # remove stopwords and stemming
+    series = series.apply(TOKENIZERS[tokenizer])
+    return series
+
+
+def _preprocess_chunk(series, tokenizer='nltk'):
+    """
+    Pre-process a chunk in a worker process and report its token table
+    usage.
+    """
+    before = dict(token_table_stats)
+    series = preprocess_series(series, tokenizer=tokenizer)
+    return series, {key: token_table_stats[key] - before[key]
+                    for key in before}
+
+
+def _init_worker(tokenizer='nltk'):
+    """
+    Load the NLTK resources of a tokenizer mode once per worker process, not
+    once per chunk.
+    """
+    if tokenizer == 'nltk':
+        word_tokenize('warm up')
+    get_stemmer().stem('warming')
+
+
+def preprocessing_pool(workers, tokenizer='nltk'):
+    """
+    Create the process pool used by `preprocessing` for `workers` > 1.
+
+    Args:
+        workers (int): Number of worker processes
+        tokenizer (str): Tokenizer mode the workers will run, see
+            `preprocess_series`
+
+    Returns:
+        ProcessPoolExecutor or nullcontext: Pool to pass to `preprocessing`,
+            or a placeholder context yielding None when running serially
+    """
+    if workers <= 1:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(tokenizer,))
+
+
+def _preprocess_column(series, executor=None, n_chunks=1, tokenizer='nltk'):
+    """
+    Pre-process a Series of raw messages, in parallel chunks when `executor`
+    is given.
+    """
+    import pandas as pd
+
+    if executor is None or n_chunks <= 1 or len(series) == 0:
+        return preprocess_series(series, tokenizer=tokenizer)
+
+    chunk_size = -(-len(series) // n_chunks)
+    chunks = [series.iloc[start:start + chunk_size]
+              for start in range(0, len(series), chunk_size)]
+    # Executor.map yields results in submission order, so rows keep their order
+    preprocess_chunk = partial(_preprocess_chunk, tokenizer=tokenizer)
+    results = list(executor.map(preprocess_chunk, chunks))
+    for _, stats in results:
+        for key, value in stats.items():
+            token_table_stats[key] += value
+    return pd.concat([chunk for chunk, _ in results])
+
+
+def _preprocess_column_cached(series, cache, executor=None, n_chunks=1,
+                              tokenizer='nltk'):
+    """
+    Pre-process a Series of raw messages, pre-processing only texts missing
+    from `cache`.
+    """
+    import pandas as pd
+
+    keys = cache_keys(series, preprocessing_config_version())
+    cached = cache_get_many(cache, keys)
+
+    missing = {}
+    for key, text in zip(keys, series):
+        if key not in cached:
+            missing.setdefault(key, text)
+    hits = sum(key in cached for key in keys)
+    cache_stats['hits'] += hits
+    cache_stats['misses'] += len(keys) - hits
+
+    if missing:
+        processed = _preprocess_column(
+            pd.Series(list(missing.values()), dtype=series.dtype),
+            executor=executor, n_chunks=n_chunks, tokenizer=tokenizer)
+        new_entries = list(zip(missing, processed))
+        cache_put_many(cache, new_entries)
+        cached.update(new_entries)
+
+    return pd.Series([cached[key] for key in keys], index=series.index,
+                     name=series.name)
+
+
+def preprocessing(df, col, executor=None, n_chunks=1, tokenizer='nltk',
+                  cache=None):
+    """
+    Pre-process the text column of a dataframe.
+
+    Args:
+        df (pd.DataFrame): Input dataframe
+        col (str): Name of the text column
+        executor (Executor): Optional pool from `preprocessing_pool` used to
+            process chunks of the column in parallel
+        n_chunks (int): Number of chunks the column is split into for
+            `executor`
+        tokenizer (str): Tokenizer mode, see `preprocess_series`
+        cache (sqlite3.Connection): Optional cache from `open_cache`; only
+            messages not found in it are pre-processed
+
+    Returns:
+        pd.DataFrame: Dataframe with the pre-processed text column; the result
+            is identical whether or not it was computed in parallel or cached
+    """
+    if cache is None:
+        df[col] = _preprocess_column(df[col], executor=executor,
+                                     n_chunks=n_chunks, tokenizer=tokenizer)
+    else:
+        df[col] = _preprocess_column_cached(df[col], cache, executor=executor,
+                                            n_chunks=n_chunks,
+                                            tokenizer=tokenizer)
     return df
 
+
+def log_token_table_stats():
+    """Log hit/miss counters of the token -> stem table."""
+    logger = logging.getLogger(__name__)
+    lookups, misses = token_table_stats['lookups'], token_table_stats['misses']
+    hit_rate = (lookups - misses) / lookups if lookups else 0.0
+    logger.info(f'Token table: {lookups - misses} hits, {misses} misses '
+                f'({hit_rate:.2%} hit rate)')
+
+
+def log_cache_stats():
+    """Log hit/miss counters of the pre-processing cache."""
+    logger = logging.getLogger(__name__)
+    hits, misses = cache_stats['hits'], cache_stats['misses']
+    hit_rate = hits / (hits + misses) if hits + misses else 0.0
+    logger.info(f'Pre-processing cache: {hits} hits, {misses} misses '
+                f'({hit_rate:.2%} hit rate)')
+
 #++++++++++++++++++++++++++++++ Pre-Processing [END] ++++++++++++++++++++++++++++++#
 
+
+# Raw export columns that carry no data
+UNUSED_COLUMNS = ['Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4']
+
+
+def row_digests(df):
+    """
+    Return the 64-bit BLAKE2b digest of every row of a dataframe, as a uint64
+    array.
+    """
+    import numpy as np
+
+    def digest(row):
+        return hashlib.blake2b(repr(row).encode(), digest_size=8).digest()
+
+    return np.fromiter(
+        (int.from_bytes(digest(row), 'little')
+         for row in df.itertuples(index=False, name=None)),
+        dtype=np.uint64, count=len(df),
+    )
+
+
+class DigestSet:
+    """
+    Set of 64-bit row digests stored as sorted uint64 arrays.
+
+    Each batch of new digests is added as a sorted run; a run is merged into
+    the previous one while it is at least as large, so there are O(log n)
+    runs, each searched with `np.searchsorted`. Storage is 8 bytes per
+    digest (twice that for the runs being merged while a merge runs),
+    against about 70 bytes per digest in a Python set of ints.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the digest arrays."""
+        return sum(run.nbytes for run in self._runs)
+
+    def contains(self, digests):
+        """Return a boolean array telling which of `digests` are in the set."""
+        import numpy as np
+
+        found = np.zeros(len(digests), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, digests), len(run) - 1)
+            found |= run[positions] == digests
+        return found
+
+    def add(self, digests):
+        """Add digests that are distinct and not yet in the set."""
+        import numpy as np
+
+        run = np.sort(digests)
+        while self._runs and len(self._runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self._runs.pop(), run]))
+        if len(run):
+            self._runs.append(run)
+
+
+def drop_seen_duplicates(df, seen_digests):
+    """
+    Drop rows whose digest was already seen, in this chunk or an earlier one.
+
+    Args:
+        df (pd.DataFrame): Chunk of raw rows
+        seen_digests (DigestSet): Digests of rows kept so far; updated in place
+
+    Returns:
+        pd.DataFrame: Chunk without the duplicate rows, first occurrences kept
+    """
+    import numpy as np
+
+    digests = row_digests(df)
+    keep = np.zeros(len(digests), dtype=bool)
+    keep[np.unique(digests, return_index=True)[1]] = True
+    keep &= ~seen_digests.contains(digests)
+    seen_digests.add(digests[keep])
+    return df[keep].copy()
+
+
+def fit_label_encoder(input_filepath, chunksize):
+    """Fit the label encoder on the label column, read chunk by chunk."""
+    from sklearn.preprocessing import LabelEncoder
+
+    classes = set()
+    for chunk in iter_frame_chunks(input_filepath, chunksize, columns=['v1'],
+                                   dtype=str):
+        classes.update(chunk['v1'])
+    le = LabelEncoder()
+    le.fit(list(classes))
+    return le
+
+
+def make_dataset_streaming(input_filepath, output_filepath, chunksize,
+                           executor=None, n_chunks=1, tokenizer='nltk',
+                           cache=None):
+    """
+    Build the processed dataset chunk by chunk with bounded memory.
+
+    Each chunk of `chunksize` raw rows is de-duplicated against every row
+    seen so far, pre-processed, label encoded and appended to the output
+    file. The rows seen so far are kept as 64-bit digests in a `DigestSet`,
+    so memory grows by about 8 bytes per unique row on top of the
+    per-chunk working set, instead of holding the rows themselves. The
+    output matches the in-memory path of `main`.
+
+    Args:
+        input_filepath (str): Path to the raw data file
+        output_filepath (str): Path of the processed data file (CSV, Parquet
+            or Feather)
+        chunksize (int): Number of raw rows read per chunk
+        executor (Executor): Optional pool from `preprocessing_pool`
+        n_chunks (int): Number of pieces each chunk is split into for
+            `executor`
+        tokenizer (str): Tokenizer mode, see `preprocess_series`
+        cache (sqlite3.Connection): Optional pre-processing cache from
+            `open_cache`
+    """
+    logger = logging.getLogger(__name__)
+
+    le = fit_label_encoder(input_filepath, chunksize)
+
+    seen_digests = DigestSet()
+    rows_read = rows_written = 0
+    reader = iter_frame_chunks(input_filepath, chunksize,
+                               dtype={'v1': str, 'v2': str})
+    with frame_writer(output_filepath) as write_chunk:
+        for chunk_number, chunk in enumerate(reader):
+            rows_read += len(chunk)
+            chunk = chunk.drop(UNUSED_COLUMNS, axis=1, errors='ignore')
+            chunk = drop_seen_duplicates(chunk, seen_digests)
+
+            chunk = preprocessing(chunk, 'v2', executor=executor,
+                                  n_chunks=n_chunks, tokenizer=tokenizer,
+                                  cache=cache)
+            chunk['v1'] = le.transform(chunk['v1'])
+
+            write_chunk(chunk)
+            rows_written += len(chunk)
+            logger.info(f'Chunk {chunk_number}: {rows_written} rows written '
+                        f'out of {rows_read} read')
+
+    logger.info(f'Dropped {rows_read - rows_written} duplicate rows '
+                f'({seen_digests.nbytes / 2**20:.1f} MiB of row digests kept)')
+
+
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def main(input_filepath, output_filepath):
+@click.option('--workers', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help='Number of processes used for pre-processing.')
+@click.option('--chunksize', type=click.IntRange(min=1), default=None,
+              help='Stream the raw data in chunks of this many rows instead '
+                   'of loading it at once.')
+@click.option('--tokenizer', type=click.Choice(sorted(TOKENIZERS)),
+              default='nltk', show_default=True,
+              help="Tokenizer mode; 'fast' tokenizes each message once and "
+                   'gives the same output.')
+@click.option('--cache', 'cache_path', type=click.Path(dir_okay=False),
+              default=None,
+              help='SQLite pre-processing cache (e.g. '
+                   'data/interim/preprocess_cache.sqlite); only new or '
+                   'changed messages are pre-processed.')
+@click.option('--near-dup-threshold',
+              type=click.FloatRange(0, 1, min_open=True), default=None,
+              help='Collapse near-duplicate messages with at least this '
+                   'estimated Jaccard similarity into one row, with the '
+                   'cluster size in an informational weight column (not '
+                   'used for training).')
+@click.option('--near-dup-perm', type=click.IntRange(min=1), default=64,
+              show_default=True,
+              help='MinHash signature length used for near-duplicate '
+                   'detection.')
+def main(input_filepath, output_filepath, workers, chunksize, tokenizer,
+         cache_path, near_dup_threshold, near_dup_perm):
     """ Runs data processing scripts to turn raw data from (../raw) into
         cleaned data ready to be analyzed (saved in ../processed).
     """
     logger = logging.getLogger(__name__)
     logger.info('making final data set from raw data')
 
+    if chunksize is not None and near_dup_threshold is not None:
+        raise click.UsageError('--near-dup-threshold needs the whole dataset '
+                               'and cannot be combined with --chunksize')
+
+    cache = open_cache(cache_path) if cache_path else None
+
+    n_chunks = workers * CHUNKS_PER_WORKER
+    if chunksize is not None:
+        with preprocessing_pool(workers, tokenizer) as executor:
+            make_dataset_streaming(input_filepath, output_filepath, chunksize,
+                                   executor=executor, n_chunks=n_chunks,
+                                   tokenizer=tokenizer, cache=cache)
+        log_token_table_stats()
+        if cache is not None:
+            log_cache_stats()
+            cache.close()
+        logger.info(f'Processed data saved to {output_filepath}')
+        return
+
     # Read the row data
-    df = pd.read_csv(input_filepath, low_memory=False)
+    df = read_frame(input_filepath)
 
     # Extracting only required columns
-    df = df.drop(['Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4'], axis=1)
+    df = df.drop(UNUSED_COLUMNS, axis=1, errors='ignore')
 
     # droping duplicate rows
     df = df.drop_duplicates()
 
     # Preprocessing
-    df = preprocessing(df, 'v2') 
+    with preprocessing_pool(workers, tokenizer) as executor:
+        df = preprocessing(df, 'v2', executor=executor, n_chunks=n_chunks,
+                           tokenizer=tokenizer, cache=cache)
+    log_token_table_stats()
+    if cache is not None:
+        log_cache_stats()
+        cache.close()
+
+    # Collapsing near-duplicate messages
+    if near_dup_threshold is not None:
+        from src.data.near_duplicates import collapse_near_duplicates
+        df = collapse_near_duplicates(df, 'v2', near_dup_threshold,
+                                      label_column='v1',
+                                      num_perm=near_dup_perm)
 
     # Label Encoding
+    from sklearn.preprocessing import LabelEncoder
     le = LabelEncoder()
     df['v1'] = le.fit_transform(df['v1'])
 
-    df.to_csv(output_filepath, index=False)
+    write_frame(df, output_filepath)
     logger.info(f'Processed data saved to {output_filepath}')
 
 
@@ -0,0 +1,185 @@
+"""
+This module collapses near-duplicate messages (e.g. spam campaign messages
+that only differ in a number or URL) with MinHash signatures and LSH banding.
+
+Messages are compared through their word shingles. Banding only proposes
+pairs of messages that agree on a whole band of their signature, so the
+stage runs in O(n log n) instead of comparing every pair of messages.
+
+The `weight` column added to the collapsed rows (the size of each cluster)
+is informational: build_features keeps only the text features, `num_words`
+and the label, so the pipeline trains on every representative as one row.
+"""
+
+import logging
+import zlib
+
+import numpy as np
+
+
+# Large odd 64-bit constant used to derive the MinHash permutations
+_GOLDEN_RATIO_64 = 0x9E3779B97F4A7C15
+
+# Number of messages whose shingles are hashed at once
+SIGNATURE_BATCH_SIZE = 10000
+
+
+def shingles(text, shingle_size=2):
+    """
+    Return the set of CRC32 hashes of the word `shingle_size`-grams of
+    `text`.
+    """
+    words = str(text).split()
+    if len(words) <= shingle_size:
+        return {zlib.crc32(' '.join(words).encode())}
+    return {
+        zlib.crc32(' '.join(words[i:i + shingle_size]).encode())
+        for i in range(len(words) - shingle_size + 1)
+    }
+
+
+def minhash_signatures(texts, num_perm=64, shingle_size=2, seed=42):
+    """
+    Compute the MinHash signature of every text.
+
+    Each permutation is a multiply-shift hash of the 32-bit shingle hashes,
+    evaluated with vectorized uint64 arithmetic.
+
+    Args:
+        texts (list): Messages
+        num_perm (int): Number of hash permutations (signature length)
+        shingle_size (int): Number of words per shingle
+        seed (int): Seed of the permutation coefficients
+
+    Returns:
+        np.ndarray: uint32 array of shape (len(texts), num_perm)
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = (rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+         ^ np.uint64(_GOLDEN_RATIO_64))
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for start in range(0, len(texts), SIGNATURE_BATCH_SIZE):
+        batch = texts[start:start + SIGNATURE_BATCH_SIZE]
+        doc_shingles = [shingles(text, shingle_size) for text in batch]
+        lengths = np.fromiter((len(s) for s in doc_shingles), dtype=np.int64,
+                              count=len(doc_shingles))
+        values = np.fromiter((h for s in doc_shingles for h in s),
+                             dtype=np.uint64, count=int(lengths.sum()))
+
+        hashed = ((values[:, None] * a + b) >> np.uint64(32)).astype(np.uint32)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        signatures[start:start + len(doc_shingles)] = np.minimum.reduceat(
+            hashed, offsets, axis=0)
+    return signatures
+
+
+def lsh_bands(num_perm, threshold):
+    """
+    Choose the (bands, rows) split of a signature for a Jaccard threshold.
+
+    Picks the divisor split whose S-curve midpoint (1 / bands) ** (1 / rows)
+    is closest to `threshold`.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1)
+              if num_perm % rows == 0]
+    return min(splits, key=lambda split: abs(
+        (1 / split[0]) ** (1 / split[1]) - threshold))
+
+
+def _find(parent, i):
+    """Find the root of `i` in the union-find forest, compressing the path."""
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def near_duplicate_clusters(signatures, threshold, groups=None):
+    """
+    Cluster rows whose estimated Jaccard similarity reaches `threshold`.
+
+    Rows sharing an LSH bucket in any band are compared with the first row of
+    that bucket, and linked when the fraction of equal signature entries is at
+    least `threshold`. Clusters are the connected components of those links.
+
+    Args:
+        signatures (np.ndarray): MinHash signatures from `minhash_signatures`
+        threshold (float): Minimum estimated Jaccard similarity
+        groups (np.ndarray): Optional integer group of every row (e.g. the
+            label); rows of different groups are never clustered together
+
+    Returns:
+        np.ndarray: Cluster id of every row, the position of its first row
+    """
+    n_rows, num_perm = signatures.shape
+    n_bands, rows_per_band = lsh_bands(num_perm, threshold)
+    parent = list(range(n_rows))
+
+    for band in range(n_bands):
+        keys = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        if groups is not None:
+            keys = np.column_stack([keys, groups.astype(np.uint32)])
+        _, buckets = np.unique(keys, axis=0, return_inverse=True)
+        buckets = buckets.ravel()
+
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        starts = np.flatnonzero(np.diff(sorted_buckets, prepend=-1))
+        sizes = np.diff(np.append(starts, n_rows))
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = order[start:start + size]
+            head = members[0]
+            similarity = (signatures[members[1:]]
+                          == signatures[head]).mean(axis=1)
+            for member in members[1:][similarity >= threshold]:
+                root_head = _find(parent, head)
+                root_member = _find(parent, member)
+                if root_head != root_member:
+                    parent[max(root_head, root_member)] = min(root_head,
+                                                              root_member)
+
+    return np.array([_find(parent, i) for i in range(n_rows)], dtype=np.int64)
+
+
+def collapse_near_duplicates(df, text_column, threshold, label_column=None,
+                             num_perm=64, shingle_size=2,
+                             weight_column='weight'):
+    """
+    Keep one representative row per cluster of near-duplicate messages.
+
+    Args:
+        df (pd.DataFrame): Pre-processed data
+        text_column (str): Name of the text column
+        threshold (float): Minimum estimated Jaccard similarity of
+            near-duplicates
+        label_column (str): Optional label column; messages with different
+            labels are never collapsed together
+        num_perm (int): MinHash signature length
+        shingle_size (int): Number of words per shingle
+        weight_column (str): Name of the added column holding the cluster size
+
+    Returns:
+        pd.DataFrame: The first row of every cluster, in original order, with
+            the number of rows it represents in `weight_column` (for
+            inspection; it is not carried into the features or used as a
+            sample weight)
+    """
+    logger = logging.getLogger(__name__)
+
+    signatures = minhash_signatures(list(df[text_column]), num_perm=num_perm,
+                                    shingle_size=shingle_size)
+    groups = None
+    if label_column is not None:
+        groups = df[label_column].factorize()[0]
+    clusters = near_duplicate_clusters(signatures, threshold, groups=groups)
+
+    representatives, weights = np.unique(clusters, return_counts=True)
+    collapsed = df.iloc[representatives].copy()
+    collapsed[weight_column] = weights
+    logger.info(f'Collapsed {len(df)} rows into {len(collapsed)} '
+                'near-duplicate clusters')
+    return collapsed
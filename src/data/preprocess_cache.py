@@ -0,0 +1,57 @@
+"""
+This module implements a persistent, content-addressed cache of pre-processed
+messages backed by SQLite, so re-runs of make_dataset only pre-process raw
+messages that are new or changed since the last run.
+
+Entries are keyed by a hash of the raw message text and of the pre-processing
+config version; changing the config simply stops matching old entries.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+
+# SQLite limits the number of bound parameters per statement
+QUERY_BATCH_SIZE = 900
+
+
+def open_cache(cache_path):
+    """Open (creating if needed) the SQLite pre-processing cache."""
+    Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS preprocessed '
+        '(key BLOB PRIMARY KEY, text TEXT NOT NULL)'
+    )
+    return conn
+
+
+def cache_keys(texts, config_version):
+    """Return the 128-bit cache key of every raw text under a config."""
+    prefix = config_version.encode() + b'\x00'
+    return [
+        hashlib.blake2b(prefix + str(text).encode(), digest_size=16).digest()
+        for text in texts
+    ]
+
+
+def cache_get_many(conn, keys):
+    """Return a dict of key -> pre-processed text for the keys in the cache."""
+    found = {}
+    unique_keys = list(set(keys))
+    for start in range(0, len(unique_keys), QUERY_BATCH_SIZE):
+        batch = unique_keys[start:start + QUERY_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        found.update(conn.execute(
+            'SELECT key, text FROM preprocessed '
+            f'WHERE key IN ({placeholders})', batch
+        ))
+    return found
+
+
+def cache_put_many(conn, items):
+    """Store (key, pre-processed text) pairs in the cache."""
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO preprocessed (key, text) '
+                         'VALUES (?, ?)', items)
@@ -0,0 +1,178 @@
+"""
+This module records the train/test split of a feature matrix as a small
+manifest, so the test rows are read back from the feature file itself
+instead of being written out a second time.
+
+The manifest (`<feature file name>.split.json`, next to the feature file)
+holds the seed, test size and number of rows the split was drawn with,
+SHA-256 digests of the train and test index lists, and the features digest
+of the feature file (see `src.data.storage.features_digest`). The indices
+themselves are not stored: `read_split` redraws the split and checks it
+against the digests, so a manifest used with a changed feature file (e.g.
+other selected columns) or a library whose split differs is rejected.
+"""
+
+import json
+from pathlib import Path
+
+from src.data.storage import (array_digest, features_digest, read_features,
+                              recorded_features_digest)
+
+SPLIT_MANIFEST_VERSION = 3
+
+
+def split_manifest_path(features_path):
+    """Return the path of the split manifest of a feature file."""
+    features_path = Path(features_path)
+    return features_path.parent / f'{features_path.name}.split.json'
+
+
+def split_indices(n_rows, test_size, random_state):
+    """
+    Draw the train/test split of `n_rows` rows.
+
+    Same rows, in the same order, as `train_test_split(X, y, ...)` with the
+    same `test_size` and `random_state`.
+
+    Returns:
+        tuple: (train_indices, test_indices) integer arrays
+    """
+    import numpy as np
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(np.arange(n_rows), test_size=test_size,
+                            random_state=random_state)
+
+
+def select_rows(X, indices):
+    """
+    Return the rows of a feature matrix (sparse matrix, array, dataframe or
+    Series) at `indices`.
+    """
+    return X.iloc[indices] if hasattr(X, 'iloc') else X[indices]
+
+
+def write_split_manifest(features_path, X, y, feature_names, train_indices,
+                         test_indices, test_size, random_state):
+    """
+    Write the split manifest of a feature file.
+
+    Args:
+        features_path (str): Feature file the indices refer to
+        X (pd.DataFrame or scipy.sparse matrix): Features of the whole
+            feature file
+        y (array-like): Labels of the whole feature file
+        feature_names (list): Names of the feature columns
+        train_indices (np.ndarray): Training rows, in training order
+        test_indices (np.ndarray): Test rows
+        test_size (float): Test size the split was drawn with
+        random_state (int): Seed the split was drawn with
+
+    Returns:
+        Path: Path of the manifest
+    """
+    import numpy as np
+
+    manifest = {
+        'version': SPLIT_MANIFEST_VERSION,
+        'features': Path(features_path).name,
+        'n_rows': len(y),
+        'test_size': test_size,
+        'random_state': random_state,
+        'features_sha256': file_features_digest(features_path, X, y,
+                                                feature_names),
+        'train_sha256': array_digest(np.asarray(train_indices,
+                                                dtype=np.int64)),
+        'test_sha256': array_digest(np.asarray(test_indices,
+                                               dtype=np.int64)),
+    }
+    path = split_manifest_path(features_path)
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+    return path
+
+
+def read_split_manifest(features_path):
+    """Read the split manifest of a feature file."""
+    with open(split_manifest_path(features_path)) as f:
+        manifest = json.load(f)
+    if manifest['version'] != SPLIT_MANIFEST_VERSION:
+        raise ValueError('Unsupported split manifest version '
+                         f'{manifest["version"]} for {features_path}')
+    return manifest
+
+
+def redraw_split(manifest, n_rows, digest):
+    """
+    Redraw the split of a manifest, after checking the manifest against its
+    feature file.
+
+    Args:
+        manifest (dict): Manifest from `read_split_manifest`
+        n_rows (int): Number of rows of the feature file
+        digest (str): `file_features_digest` of the feature file
+
+    Returns:
+        tuple: (train_indices, test_indices) int64 arrays
+
+    Raises:
+        ValueError: On the first mismatch
+    """
+    import numpy as np
+
+    if n_rows != manifest['n_rows'] or digest != manifest['features_sha256']:
+        raise ValueError('The features or labels differ from those of '
+                         f'{manifest["features"]} the split was drawn on; '
+                         'run train_model again')
+
+    train_indices, test_indices = split_indices(n_rows,
+                                                manifest['test_size'],
+                                                manifest['random_state'])
+    train_indices = np.asarray(train_indices, dtype=np.int64)
+    test_indices = np.asarray(test_indices, dtype=np.int64)
+    if (array_digest(train_indices) != manifest['train_sha256']
+            or array_digest(test_indices) != manifest['test_sha256']):
+        raise ValueError(
+            'The split is not the one its seed and test size reproduce')
+    return train_indices, test_indices
+
+
+def read_split(features_path, target_column):
+    """
+    Read a feature file with the split its manifest records.
+
+    Args:
+        features_path (str): Feature file train_model split
+        target_column (str): Name of the label column
+
+    Returns:
+        tuple: (X, y, train_indices, test_indices) of the whole feature file
+
+    Raises:
+        FileNotFoundError: If the feature file has no split manifest
+        ValueError: If the manifest does not match the feature file
+    """
+    manifest_path = split_manifest_path(features_path)
+    if not manifest_path.exists():
+        raise FileNotFoundError(f'No split manifest at {manifest_path}; '
+                                f'run train_model on {features_path} first')
+    X, y, feature_names = read_features(features_path, target_column)
+    manifest = read_split_manifest(features_path)
+    digest = file_features_digest(features_path, X, y, feature_names)
+    try:
+        train_indices, test_indices = redraw_split(manifest, len(y), digest)
+    except ValueError as e:
+        raise ValueError(f'{manifest_path}: {e}') from e
+    return X, y, train_indices, test_indices
+
+
+def file_features_digest(features_path, X, y, feature_names):
+    """
+    Return the features digest `write_features` recorded in a feature file,
+    or compute it from `X`, `y` and `feature_names` for formats that do not
+    record one.
+    """
+    digest = recorded_features_digest(features_path)
+    if digest is None:
+        digest = features_digest(X, y, feature_names)
+    return digest
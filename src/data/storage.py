@@ -0,0 +1,398 @@
+"""
+This module reads and writes the dataframes handed between pipeline stages.
+
+The file format is detected from the file extension:
+- .parquet / .pq: Apache Parquet
+- .feather / .arrow: Arrow IPC (Feather v2)
+- anything else: CSV
+
+Feature matrices can also be stored sparse, see `write_features` and
+`read_features`:
+- .npz: CSR arrays, feature names and labels in one file
+- .store: directory of raw .npy arrays (CSR data/indices/indptr, labels and
+  feature names) with a manifest.json, opened memory-mapped so that loading
+  is O(1) and processes reading the same store share its pages
+
+Both sparse formats record the `features_digest` of what they hold when
+written, so checking a feature file against it (see `src.data.split`) does
+not hash the whole matrix on every read.
+
+Columnar formats are written with compact dtypes (float32 features and the
+smallest integer type holding each integer column, e.g. int8 labels), and
+need pyarrow to be installed. pandas and pyarrow are imported on first use.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+
+
+FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+
+def frame_format(path):
+    """Return the storage format ('csv', 'parquet' or 'feather') of `path`."""
+    return FORMATS.get(Path(path).suffix.lower(), 'csv')
+
+
+def compact_dtypes(df):
+    """
+    Downcast float columns to float32 and integer columns to the smallest
+    integer type.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = df.copy()
+    for column in df.columns:
+        dtype = df[column].dtype
+        if pd.api.types.is_float_dtype(dtype):
+            df[column] = df[column].astype(np.float32)
+        elif pd.api.types.is_integer_dtype(dtype):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def read_frame(path, columns=None):
+    """
+    Read a dataframe stored in any supported format.
+
+    Args:
+        path (str): File path; the format is detected from its extension
+        columns (list): Optional subset of columns to read
+
+    Returns:
+        pd.DataFrame: The stored dataframe
+    """
+    import pandas as pd
+
+    file_format = frame_format(path)
+    if file_format == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if file_format == 'feather':
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, low_memory=False)
+
+
+def iter_frame_chunks(path, chunksize, columns=None, dtype=None):
+    """
+    Iterate over a stored dataframe in chunks of at most `chunksize` rows.
+
+    Args:
+        path (str): File path; the format is detected from its extension
+        chunksize (int): Maximum number of rows per chunk
+        columns (list): Optional subset of columns to read
+        dtype (dict): Optional column dtypes, only used for CSV files
+
+    Yields:
+        pd.DataFrame: Consecutive chunks with a running RangeIndex
+    """
+    import pandas as pd
+
+    file_format = frame_format(path)
+    if file_format == 'csv':
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype,
+                               chunksize=chunksize)
+        return
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(
+        path, format='parquet' if file_format == 'parquet' else 'ipc')
+    start = 0
+    for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def write_frame(df, path):
+    """
+    Write a dataframe without its index, in the format given by the extension
+    of `path`.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    file_format = frame_format(path)
+    if file_format == 'parquet':
+        compact_dtypes(df).to_parquet(path, index=False)
+    elif file_format == 'feather':
+        compact_dtypes(df).reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+@contextmanager
+def frame_writer(path):
+    """
+    Open `path` for writing a dataframe chunk by chunk.
+
+    Yields:
+        callable: Function appending a dataframe chunk to the file; every
+            chunk is converted to the schema of the first one
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    file_format = frame_format(path)
+
+    if file_format == 'csv':
+        first = [True]
+
+        def write(df):
+            df.to_csv(path, index=False, mode='w' if first[0] else 'a',
+                      header=first[0])
+            first[0] = False
+
+        yield write
+        return
+
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+    writers = []
+
+    def write(df):
+        table = pa.Table.from_pandas(compact_dtypes(df), preserve_index=False)
+        if not writers:
+            if file_format == 'parquet':
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                writer = pa.ipc.new_file(path, table.schema)
+            writers.append((writer, table.schema))
+        writer, schema = writers[0]
+        writer.write_table(table.cast(schema))
+
+    try:
+        yield write
+    finally:
+        for writer, _ in writers:
+            writer.close()
+
+
+# Version of the feature store layout written to its manifest
+FEATURE_STORE_VERSION = 1
+
+
+def is_store_path(path):
+    """Return True if `path` is a memory-mapped feature store (.store)."""
+    return Path(path).suffix.lower() == '.store'
+
+
+def is_sparse_path(path):
+    """Return True if `path` holds a sparse feature matrix (.npz or .store)."""
+    return Path(path).suffix.lower() == '.npz' or is_store_path(path)
+
+
+def array_digest(array):
+    """Return the SHA-256 hex digest of an array's dtype and values."""
+    import hashlib
+
+    import numpy as np
+
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha256(str(array.dtype).encode())
+    digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def features_digest(X, y, feature_names):
+    """
+    Return the SHA-256 hex digest of a feature matrix and its labels: the
+    shape, column names and values of the matrix (CSR data, indices and
+    indptr of sparse matrices; every column of dataframes) and the label
+    values.
+    """
+    import hashlib
+    import json
+
+    import numpy as np
+    import scipy.sparse as sp
+
+    digest = hashlib.sha256(json.dumps({
+        'shape': [int(size) for size in X.shape],
+        'feature_names': [str(name) for name in feature_names],
+    }).encode())
+    if sp.issparse(X):
+        X = sp.csr_matrix(X)
+        arrays = [X.data, X.indices, X.indptr]
+    else:
+        arrays = [X[column].to_numpy() for column in X.columns]
+    for array in arrays + [np.asarray(y)]:
+        digest.update(array_digest(array).encode())
+    return digest.hexdigest()
+
+
+def recorded_features_digest(path):
+    """
+    Return the `features_digest` recorded in a .store or .npz feature file,
+    or None for other formats and files written without one.
+    """
+    import json
+
+    import numpy as np
+
+    if is_store_path(path):
+        with open(Path(path) / 'manifest.json') as f:
+            return json.load(f).get('features_sha256')
+    if is_sparse_path(path):
+        with np.load(path) as stored:
+            if 'features_sha256' in stored.files:
+                return str(stored['features_sha256'])
+    return None
+
+
+def write_feature_store(path, X, y, target_column, feature_names):
+    """
+    Write a feature store: one .npy file per array and a manifest.json.
+
+    Args:
+        path (str): Store directory, created if needed
+        X (scipy.sparse matrix): Features, stored as CSR with float32 values
+        y (np.ndarray): Labels
+        target_column (str): Name of the label column
+        feature_names (list): Column names of `X`
+    """
+    import json
+
+    import numpy as np
+    import scipy.sparse as sp
+
+    store = Path(path)
+    store.mkdir(parents=True, exist_ok=True)
+    # Removed first and written last: a store without manifest is
+    # incomplete, also while an earlier store is being overwritten
+    (store / 'manifest.json').unlink(missing_ok=True)
+    X = sp.csr_matrix(X, dtype=np.float32)
+    arrays = {
+        'data': X.data,
+        'indices': X.indices,
+        'indptr': X.indptr,
+        'labels': np.asarray(y),
+        'feature_names': np.array(feature_names, dtype=str),
+    }
+    for name, array in arrays.items():
+        np.save(store / f'{name}.npy', array)
+
+    manifest = {
+        'version': FEATURE_STORE_VERSION,
+        'format': 'csr',
+        'shape': list(X.shape),
+        'nnz': int(X.nnz),
+        'target': target_column,
+        'features_sha256': features_digest(X, arrays['labels'],
+                                           feature_names),
+        'arrays': {name: {'dtype': str(array.dtype),
+                          'shape': list(array.shape)}
+                   for name, array in arrays.items()},
+    }
+    with open(store / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_feature_store(path):
+    """
+    Open a feature store written by `write_feature_store`, memory-mapped.
+
+    Returns:
+        tuple: (X, y, feature_names) where X is a CSR matrix and y an array,
+            both backed by read-only memory maps of the store files
+    """
+    import json
+
+    import numpy as np
+    import scipy.sparse as sp
+
+    store = Path(path)
+    with open(store / 'manifest.json') as f:
+        manifest = json.load(f)
+    if manifest['version'] != FEATURE_STORE_VERSION:
+        raise ValueError('Unsupported feature store version '
+                         f'{manifest["version"]} in {path}')
+
+    arrays = {name: np.load(store / f'{name}.npy', mmap_mode='r')
+              for name in manifest['arrays']}
+    X = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                      shape=tuple(manifest['shape']), copy=False)
+    return X, arrays['labels'], arrays['feature_names'].tolist()
+
+
+def write_features(path, X, y, target_column, feature_names=None):
+    """
+    Write a feature matrix and its labels.
+
+    .npz files and .store directories keep the matrix sparse (CSR, float32
+    values); any other format stores a dataframe of the features followed
+    by the label column.
+
+    Args:
+        path (str): File path; the format is detected from its extension
+        X (pd.DataFrame or scipy.sparse matrix): Features
+        y (pd.Series or np.ndarray): Labels
+        target_column (str): Name of the label column
+        feature_names (list): Column names of a sparse `X`; defaults to the
+            dataframe columns
+    """
+    import numpy as np
+    import pandas as pd
+    import scipy.sparse as sp
+
+    if feature_names is None:
+        feature_names = list(X.columns)
+
+    if is_store_path(path):
+        write_feature_store(path, X, y, target_column, feature_names)
+        return
+
+    if is_sparse_path(path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        X = sp.csr_matrix(X, dtype=np.float32)
+        np.savez(
+            path,
+            data=X.data,
+            indices=X.indices,
+            indptr=X.indptr,
+            shape=np.array(X.shape),
+            feature_names=np.array(feature_names, dtype=str),
+            labels=np.asarray(y),
+            target=np.array(target_column),
+            features_sha256=np.array(
+                features_digest(X, np.asarray(y), feature_names)),
+        )
+        return
+
+    if sp.issparse(X):
+        X = pd.DataFrame(X.toarray(), columns=feature_names)
+    if not isinstance(y, pd.Series):
+        y = pd.Series(np.asarray(y), index=X.index)
+    write_frame(pd.concat([X, y.rename(target_column)], axis=1), path)
+
+
+def read_features(path, target_column):
+    """
+    Read a feature matrix and its labels written by `write_features`.
+
+    Returns:
+        tuple: (X, y, feature_names) where X is a CSR matrix and y an array
+            for .npz files and (memory-mapped) .store directories, and X a
+            dataframe and y a Series otherwise
+    """
+    if is_store_path(path):
+        return read_feature_store(path)
+
+    if is_sparse_path(path):
+        import numpy as np
+        import scipy.sparse as sp
+
+        with np.load(path) as stored:
+            X = sp.csr_matrix(
+                (stored['data'], stored['indices'], stored['indptr']),
+                shape=tuple(stored['shape']))
+            return X, stored['labels'], list(stored['feature_names'])
+
+    df = read_frame(path)
+    X = df.drop([target_column], axis=1)
+    return X, df[target_column], list(X.columns)
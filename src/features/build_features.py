@@ -1,25 +1,319 @@
 """
 This module builds text features from processed data for spam classification.
 It creates TF-IDF features and word count features from the input text data.
+
+The TF-IDF term space is selected in params.yaml (`features.vectorizer`):
+- tfidf: vocabulary fitted on the whole corpus, limited to `max_features`
+  terms; with `fit_workers` > 1 term counts are map-reduced over shards of the
+  corpus and give the same vocabulary and IDF weights as the serial fit
+- hashing: stateless hashed term space of `n_features` columns; chunks of the
+  input are featurized independently (in parallel with `workers` > 1) and the
+  IDF weights are gathered from their document frequencies
+
+Terms are extracted by the analyzer selected with `features.analyzer`:
+- regex: sklearn's word analyzer (token regex, lowercasing, English stop
+  words), which works on any text
+- pretokenized: splits on whitespace only. make_dataset output is already
+  lowercased, stripped of punctuation and stop words, and stemmed, with
+  tokens joined by single spaces, so nothing is done twice. Unlike the regex
+  analyzer it keeps one-character tokens ("u", "2") and the words only
+  sklearn's stop word list holds ("call", "please", "free"...)
 """
 
 import click
-import pandas as pd
-from nltk.tokenize import word_tokenize
-import nltk
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from pathlib import Path
 import logging
 from dotenv import find_dotenv, load_dotenv
-from sklearn.feature_extraction.text import TfidfVectorizer
-from joblib import dump
+import yaml
+from src.data.make_dataset import fast_tokenize, word_tokenize
+from src.data.storage import (is_sparse_path, iter_frame_chunks, read_frame,
+                              write_features, write_frame)
+from src.features.slim_vectorizer import (SLIM_VECTORIZER_FILENAME,
+                                          export_slim_vectorizer)
 
 # nltk.download('punkt')
 
+# Artifacts saved next to the feature matrix
+VECTORIZER_FILENAME = 'tfidf_vectorizer.joblib'
+TERM_STATS_FILENAME = 'tfidf_term_stats.npz'
+
+
+def load_params(params_path):
+    """Load feature parameters from YAML config file."""
+    with open(params_path, 'r') as f:
+        params = yaml.safe_load(f)
+    return params
+
 def count_total_words(text):
     """Count the total number of words in a text string using NLTK word tokenization."""
     return len(word_tokenize(text))
 
-def create_tfidf_features(df, text_column='v2', max_features=4000):
+
+def count_total_words_fast(text):
+    """
+    Count words of pre-processed text with `fast_tokenize`; same count as
+    `count_total_words`.
+    """
+    return len(fast_tokenize(text))
+
+
+# Word counting function for each tokenizer mode
+WORD_COUNTERS = {
+    'nltk': count_total_words,
+    'fast': count_total_words_fast,
+}
+
+# Term extraction settings of the sklearn vectorizers for each analyzer mode
+ANALYZER_PARAMS = {
+    'regex': {'stop_words': 'english', 'lowercase': True},
+    'pretokenized': {'analyzer': str.split, 'lowercase': False},
+}
+
+
+def remove_stale_artifacts(directory, filenames):
+    """Delete artifacts of an earlier run that this run does not rewrite."""
+    logger = logging.getLogger(__name__)
+    for filename in filenames:
+        path = Path(directory) / filename
+        if path.exists():
+            path.unlink()
+            logger.info(f'Removed stale {path}')
+
+
+def analyzer_mode(vectorizer):
+    """Return the analyzer mode ('regex' or 'pretokenized') of a vectorizer."""
+    return 'pretokenized' if vectorizer.analyzer is str.split else 'regex'
+
+
+def make_tfidf_vectorizer(max_features=4000, analyzer='regex'):
+    """Return the (unfitted) TF-IDF vectorizer of the 'tfidf' feature mode."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(max_features=max_features,
+                           **ANALYZER_PARAMS[analyzer])
+
+
+def _count_terms(texts, analyzer='regex'):
+    """Return the term and document frequencies of `texts`."""
+    analyze = make_tfidf_vectorizer(analyzer=analyzer).build_analyzer()
+    term_frequency, document_frequency = Counter(), Counter()
+    for text in texts:
+        terms = analyze(text)
+        term_frequency.update(terms)
+        document_frequency.update(set(terms))
+    return term_frequency, document_frequency
+
+
+def _shards(texts, n_shards):
+    """Split `texts` into at most `n_shards` contiguous lists."""
+    size = max(1, -(-len(texts) // n_shards))
+    return [texts[start:start + size] for start in range(0, len(texts), size)]
+
+
+def count_term_frequencies(texts, executor=None, n_shards=1, analyzer='regex'):
+    """
+    Count term and document frequencies of `texts`, map-reduce style.
+
+    Shards of `texts` are counted independently (across processes when
+    `executor` is given) and their counts are summed, with the terms of the
+    `analyzer` mode.
+
+    Returns:
+        tuple: (term_frequency, document_frequency) Counters over all terms
+    """
+    map_shards = executor.map if executor is not None else map
+    term_frequency, document_frequency = Counter(), Counter()
+    count_terms = partial(_count_terms, analyzer=analyzer)
+    shards = _shards(texts, n_shards)
+    for shard_tf, shard_df in map_shards(count_terms, shards):
+        term_frequency.update(shard_tf)
+        document_frequency.update(shard_df)
+    return term_frequency, document_frequency
+
+
+def tfidf_from_term_counts(term_frequency, document_frequency, n_documents,
+                           max_features=4000, analyzer='regex'):
+    """
+    Build a fitted TF-IDF vectorizer from corpus term counts.
+
+    Applies the selection and weighting of `TfidfVectorizer.fit` (terms in
+    sorted order, the `max_features` most frequent kept with the same tie
+    breaking, smoothed IDF), so the result has the same `vocabulary_` and
+    `idf_` as fitting it on the corpus.
+
+    Args:
+        term_frequency (Counter): Total count of every term
+        document_frequency (Counter): Number of documents containing every term
+        n_documents (int): Number of documents of the corpus
+        max_features (int): Maximum number of TF-IDF features
+        analyzer (str): Analyzer mode the terms were counted with
+
+    Returns:
+        TfidfVectorizer: Fitted vectorizer
+    """
+    import numpy as np
+
+    if not term_frequency:
+        raise ValueError('empty vocabulary; perhaps the documents only '
+                         'contain stop words')
+
+    terms = sorted(term_frequency)
+    if max_features is not None and len(terms) > max_features:
+        # Term frequencies are float64 sums in TfidfVectorizer; same values,
+        # same argsort
+        tfs = np.array([term_frequency[term] for term in terms],
+                       dtype=np.float64)
+        mask = np.zeros(len(terms), dtype=bool)
+        mask[(-tfs).argsort()[:max_features]] = True
+        kept = np.flatnonzero(mask)
+    else:
+        kept = np.arange(len(terms))
+    if max_features is not None:
+        new_indices = np.arange(len(kept))
+    else:
+        new_indices = range(len(kept))
+    indices = {terms[old]: new for old, new in zip(kept, new_indices)}
+    # Counters keep the order in which terms first appear, like the fitted
+    # vocabulary
+    vocabulary = {term: indices[term]
+                  for term in term_frequency if term in indices}
+
+    dfs = np.array([document_frequency[terms[i]] for i in kept],
+                   dtype=np.float64)
+    dfs += 1.0
+    idf = np.full_like(dfs, fill_value=n_documents + 1, dtype=np.float64)
+    idf /= dfs
+    np.log(idf, out=idf)
+    idf += 1.0
+
+    vectorizer = make_tfidf_vectorizer(max_features, analyzer)
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.idf_ = idf
+    vectorizer._tfidf.n_features_in_ = len(idf)
+    return vectorizer
+
+
+def save_term_stats(path, term_stats):
+    """
+    Save the term statistics of a TF-IDF fit (see `_word_counts_and_tfidf`).
+
+    Terms are stored in order of first appearance, so a vectorizer rebuilt
+    from them has the same vocabulary order as a full fit.
+    """
+    import numpy as np
+
+    term_frequency, document_frequency, n_documents = term_stats
+    terms = list(term_frequency)
+    np.savez(
+        path,
+        terms=np.array(terms, dtype=str),
+        term_frequency=np.array([term_frequency[term] for term in terms],
+                                dtype=np.int64),
+        document_frequency=np.array(
+            [document_frequency[term] for term in terms], dtype=np.int64),
+        n_documents=np.array(n_documents),
+    )
+
+
+def load_term_stats(path):
+    """Load term statistics saved by `save_term_stats`."""
+    import numpy as np
+
+    with np.load(path) as stored:
+        terms = stored['terms'].tolist()
+        term_frequency = Counter(
+            dict(zip(terms, stored['term_frequency'].tolist())))
+        document_frequency = Counter(
+            dict(zip(terms, stored['document_frequency'].tolist())))
+        return term_frequency, document_frequency, int(stored['n_documents'])
+
+
+def _transform_shard(texts, vectorizer, tokenizer):
+    """Return the TF-IDF rows and word counts of a shard of texts."""
+    import numpy as np
+
+    num_words = np.fromiter((WORD_COUNTERS[tokenizer](text) for text in texts),
+                            dtype=np.int64, count=len(texts))
+    return vectorizer.transform(texts), num_words
+
+
+def _word_counts_and_tfidf(df, text_column, max_features, tokenizer,
+                           executor=None, n_shards=1, analyzer='regex'):
+    """
+    Add the 'num_words' column to `df` and fit the TF-IDF vectorizer on
+    `text_column`.
+
+    With an `executor`, the vectorizer is fitted from map-reduced term counts
+    and the shards are transformed in parallel; the result is the same.
+
+    Returns:
+        tuple: (bow_matrix, vectorizer, term_stats) where term_stats holds the
+            term frequencies, document frequencies and number of documents
+            of all terms, as taken by `save_term_stats`
+    """
+    logger = logging.getLogger(__name__)
+
+    df[text_column] = df[text_column].astype(str)
+    if executor is not None:
+        import numpy as np
+        import scipy.sparse as sp
+
+        logger.info(f'Fitting TF-IDF vocabulary on {n_shards} shards')
+        texts = list(df[text_column])
+        term_frequency, document_frequency = count_term_frequencies(
+            texts, executor, n_shards, analyzer)
+        vectorizer = tfidf_from_term_counts(
+            term_frequency, document_frequency, len(texts),
+            max_features=max_features, analyzer=analyzer)
+
+        logger.info('Creating TF-IDF and word count features')
+        transform_shard = partial(_transform_shard, vectorizer=vectorizer,
+                                  tokenizer=tokenizer)
+        shards = list(executor.map(transform_shard, _shards(texts, n_shards)))
+        word_counts = [num_words for _, num_words in shards]
+        df['num_words'] = np.concatenate(word_counts) if shards else []
+        bow_matrix = sp.vstack([rows for rows, _ in shards], format='csr')
+        term_stats = (term_frequency, document_frequency, len(texts))
+        return bow_matrix, vectorizer, term_stats
+
+    logger.info('Creating word count feature')
+    df['num_words'] = df[text_column].apply(WORD_COUNTERS[tokenizer])
+
+    logger.info('Creating TF-IDF features')
+    import numpy as np
+    from sklearn.feature_extraction.text import (CountVectorizer,
+                                                 TfidfTransformer)
+
+    # Count every term in one pass, so the statistics of the terms left out
+    # by max_features are kept for incremental updates
+    counter = CountVectorizer(dtype=np.float64, **ANALYZER_PARAMS[analyzer])
+    counts = counter.fit_transform(df[text_column])
+    column_tf = np.asarray(counts.sum(axis=0)).ravel()
+    column_df = np.bincount(counts.indices, minlength=counts.shape[1])
+    term_frequency = Counter({term: int(column_tf[i])
+                              for term, i in counter.vocabulary_.items()})
+    document_frequency = Counter({term: int(column_df[i])
+                                  for term, i in counter.vocabulary_.items()})
+    vectorizer = tfidf_from_term_counts(
+        term_frequency, document_frequency, len(df),
+        max_features=max_features, analyzer=analyzer)
+
+    kept = [counter.vocabulary_[term]
+            for term in sorted(vectorizer.vocabulary_)]
+    transformer = TfidfTransformer()
+    transformer.idf_ = vectorizer.idf_
+    bow_matrix = transformer.transform(counts[:, kept])
+    term_stats = (term_frequency, document_frequency, len(df))
+    return bow_matrix, vectorizer, term_stats
+
+
+def create_tfidf_features(df, text_column='v2', max_features=4000,
+                          tokenizer='nltk', executor=None, n_shards=1,
+                          return_term_stats=False, analyzer='regex'):
     """
     Create TF-IDF and word count features from text data.
     
@@ -27,25 +321,27 @@ def create_tfidf_features(df, text_column='v2', max_features=4000):
         df (pd.DataFrame): Input dataframe containing text data
         text_column (str): Name of column containing text data. Defaults to 'v2'
         max_features (int): Maximum number of TF-IDF features to create. Defaults to 4000
+        tokenizer (str): 'nltk' or 'fast' word counting. Defaults to 'nltk'
+        executor (concurrent.futures.Executor): Optional pool fitting and
+            transforming `n_shards` shards of the texts in parallel
+        n_shards (int): Number of shards when `executor` is given
+        return_term_stats (bool): Also return the term statistics to persist
+            with `save_term_stats`
+        analyzer (str): 'regex' or 'pretokenized' term extraction. Defaults
+            to 'regex'
         
     Returns:
         tuple: (final_df, vectorizer) where:
             - final_df (pd.DataFrame): DataFrame containing TF-IDF features, word counts, and labels
             - vectorizer (TfidfVectorizer): Fitted TF-IDF vectorizer object
+            followed by term_stats when `return_term_stats` is True
    """
-    logger = logging.getLogger(__name__)
-    logger.info('Creating word count feature')
+    import pandas as pd
 
-    df[text_column] = df[text_column].astype(str)
-    df['num_words'] = df[text_column].apply(count_total_words)
-    
-    logger.info('Creating TF-IDF features')
-    vectorizer = TfidfVectorizer(
-        stop_words='english',
-        max_features=max_features,
-        lowercase=True,
-    )
-    bow_matrix = vectorizer.fit_transform(df[text_column])
+    logger = logging.getLogger(__name__)
+    bow_matrix, vectorizer, term_stats = _word_counts_and_tfidf(
+        df, text_column, max_features, tokenizer, executor=executor,
+        n_shards=n_shards, analyzer=analyzer)
     
     logger.info('Converting TF-IDF matrix to dataframe')
     bow_matrix_df = pd.DataFrame(bow_matrix.toarray())
@@ -58,39 +354,271 @@ def create_tfidf_features(df, text_column='v2', max_features=4000):
     
     final_df = final_df.rename(str, axis="columns")
     
+    if return_term_stats:
+        return final_df, vectorizer, term_stats
     return final_df, vectorizer
 
 
+def create_sparse_features(df, text_column='v2', max_features=4000,
+                           tokenizer='nltk', target_column='v1',
+                           executor=None, n_shards=1, return_term_stats=False,
+                           analyzer='regex'):
+    """
+    Create TF-IDF and word count features as a sparse matrix.
+
+    Same features as `create_tfidf_features`, without densifying the TF-IDF
+    matrix: memory use scales with its number of non-zero entries.
+
+    Args:
+        df (pd.DataFrame): Input dataframe containing text data
+        text_column (str): Name of column containing text data. Defaults
+            to 'v2'
+        max_features (int): Maximum number of TF-IDF features to create.
+            Defaults to 4000
+        tokenizer (str): 'nltk' or 'fast' word counting. Defaults to 'nltk'
+        target_column (str): Name of the label column. Defaults to 'v1'
+        executor (concurrent.futures.Executor): Optional pool fitting and
+            transforming `n_shards` shards of the texts in parallel
+        n_shards (int): Number of shards when `executor` is given
+        return_term_stats (bool): Also return the term statistics to persist
+            with `save_term_stats`
+        analyzer (str): 'regex' or 'pretokenized' term extraction. Defaults
+            to 'regex'
+
+    Returns:
+        tuple: (X, y, feature_names, vectorizer) where:
+            - X (scipy.sparse.csr_matrix): TF-IDF features followed by the
+              word count
+            - y (np.ndarray): Labels
+            - feature_names (list): Column names, as in `create_tfidf_features`
+            - vectorizer (TfidfVectorizer): Fitted TF-IDF vectorizer object
+            followed by term_stats when `return_term_stats` is True
+    """
+    import scipy.sparse as sp
+
+    bow_matrix, vectorizer, term_stats = _word_counts_and_tfidf(
+        df, text_column, max_features, tokenizer, executor=executor,
+        n_shards=n_shards, analyzer=analyzer)
+    X = sp.hstack([bow_matrix, df[['num_words']].to_numpy()], format='csr')
+    feature_names = ([str(i) for i in range(bow_matrix.shape[1])]
+                     + ['num_words'])
+    y = df[target_column].to_numpy()
+    if return_term_stats:
+        return X, y, feature_names, vectorizer, term_stats
+    return X, y, feature_names, vectorizer
+
+
+def transform_texts(texts, vectorizer, tokenizer='nltk', selector=None):
+    """
+    Featurize processed texts with a fitted vectorizer, for inference.
+
+    Args:
+        texts (iterable): Processed messages (make_dataset output)
+        vectorizer: Fitted vectorizer saved by build_features, pickled or
+            compact (see `slim_vectorizer.load_vectorizer`)
+        tokenizer (str): 'nltk' or 'fast' word counting. Defaults to 'nltk'
+        selector (SelectKBest): Optional selector saved by select_features
+
+    Returns:
+        scipy.sparse.csr_matrix: Feature columns followed by the word count,
+            reduced to the selected columns when `selector` is given
+    """
+    import scipy.sparse as sp
+
+    bow_matrix, num_words = _transform_shard([str(text) for text in texts],
+                                             vectorizer, tokenizer)
+    X = sp.hstack([bow_matrix, num_words[:, None]], format='csr')
+    return selector.transform(X) if selector is not None else X
+
+
+def make_hashing_vectorizer(n_features, analyzer='regex'):
+    """
+    Return the stateless vectorizer counting terms into `n_features` hashed
+    columns.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        n_features=n_features,
+        alternate_sign=False,
+        norm=None,
+        **ANALYZER_PARAMS[analyzer],
+    )
+
+
+def _hash_chunk(texts, n_features, tokenizer, analyzer='regex'):
+    """Return the hashed term counts and word counts of a chunk of texts."""
+    import numpy as np
+
+    texts = [str(text) for text in texts]
+    counts = make_hashing_vectorizer(n_features, analyzer).transform(texts)
+    num_words = np.fromiter((WORD_COUNTERS[tokenizer](text) for text in texts),
+                            dtype=np.int64, count=len(texts))
+    return counts, num_words
+
+
+def create_hashed_features(chunks, n_features=2**18, tokenizer='nltk',
+                           text_column='v2', target_column='v1', executor=None,
+                           analyzer='regex'):
+    """
+    Create hashed TF-IDF and word count features, chunk by chunk.
+
+    Chunks are featurized independently (across processes when `executor` is
+    given); their document frequencies are summed as they arrive and turned
+    into the smoothed IDF weights `TfidfVectorizer` would use, so the result
+    only differs from the vocabulary mode by its term space.
+
+    Args:
+        chunks (iterable): DataFrames with the text and label columns
+        n_features (int): Number of hashed term columns
+        tokenizer (str): 'nltk' or 'fast' word counting. Defaults to 'nltk'
+        text_column (str): Name of column containing text data. Defaults
+            to 'v2'
+        target_column (str): Name of the label column. Defaults to 'v1'
+        executor (concurrent.futures.Executor): Optional pool featurizing
+            chunks
+        analyzer (str): 'regex' or 'pretokenized' term extraction. Defaults
+            to 'regex'
+
+    Returns:
+        tuple: (X, y, feature_names, vectorizer) as for
+            `create_sparse_features`; the vectorizer is a Pipeline of the
+            HashingVectorizer and a TfidfTransformer holding the IDF weights
+    """
+    import numpy as np
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import normalize
+
+    logger = logging.getLogger(__name__)
+    labels = []
+
+    def texts():
+        for chunk in chunks:
+            labels.append(chunk[target_column].to_numpy())
+            yield list(chunk[text_column])
+
+    counts, num_words = [], []
+    document_frequency = np.zeros(n_features, dtype=np.int64)
+    map_chunks = executor.map if executor is not None else map
+    hash_chunk = partial(_hash_chunk, n_features=n_features,
+                         tokenizer=tokenizer, analyzer=analyzer)
+    for chunk_counts, chunk_num_words in map_chunks(hash_chunk, texts()):
+        document_frequency += np.bincount(chunk_counts.indices,
+                                          minlength=n_features)
+        counts.append(chunk_counts)
+        num_words.append(chunk_num_words)
+
+    counts = sp.vstack(counts, format='csr')
+    n_documents = counts.shape[0]
+    logger.info(f'Hashed {n_documents} documents into '
+                f'{np.count_nonzero(document_frequency)} of {n_features} '
+                'term columns')
+
+    idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+    tfidf = normalize(counts.multiply(idf).tocsr())
+    X = sp.hstack([tfidf, np.concatenate(num_words)[:, None]], format='csr')
+
+    transformer = TfidfTransformer()
+    transformer.idf_ = idf
+    vectorizer = Pipeline([
+        ('hashing', make_hashing_vectorizer(n_features, analyzer)),
+        ('tfidf', transformer),
+    ])
+    feature_names = [str(i) for i in range(n_features)] + ['num_words']
+    return X, np.concatenate(labels), feature_names, vectorizer
+
+
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def build_features(input_filepath, output_filepath):
+@click.option('--tokenizer', type=click.Choice(sorted(WORD_COUNTERS)),
+              default='nltk', show_default=True,
+              help="Word counting tokenizer; 'fast' expects make_dataset "
+                   "output and gives the same counts.")
+def build_features(input_filepath, output_filepath, tokenizer):
     """
     Build features from processed data.
     
     Args:
-        input_filepath (str): Path to input CSV file containing processed text data
+        input_filepath (str): Path to input file containing processed text data
         output_filepath (str): Path where output feature matrix will be saved
+            (.store feature store, sparse .npz, or CSV, Parquet or Feather,
+            from the file extension)
+        tokenizer (str): Tokenizer used to count words
+
+    The vectorizer and analyzer modes and their settings are read from
+    params.yaml.
         
     The function:
     1. Loads processed text data
     2. Creates TF-IDF and word count features
-    3. Saves feature matrix and TF-IDF vectorizer
+    3. Saves feature matrix and TF-IDF vectorizer, and in 'tfidf' mode the
+       term statistics used by `update_vectorizer` and, with `slim_vectorizer`,
+       the compact vectorizer artifact of `slim_vectorizer`
     """
+    from joblib import dump
+
     logger = logging.getLogger(__name__)
-    
-    logger.info('Loading processed data')
-    df = pd.read_csv(input_filepath)
-    
-    # Create features
-    final_df, vectorizer = create_tfidf_features(df)
 
+    params_path = Path(__file__).resolve().parents[2] / 'params.yaml'
+    params = load_params(params_path)['features']
     
-    final_df.to_csv(output_filepath, index=False)
+    # Create features
+    if params['vectorizer'] == 'hashing':
+        hashing = params['hashing']
+        logger.info('Loading processed data in chunks')
+        chunks = iter_frame_chunks(input_filepath, hashing['chunksize'])
+        workers = hashing['workers']
+        pool = ProcessPoolExecutor(workers) if workers > 1 else nullcontext()
+        with pool as executor:
+            X, y, feature_names, vectorizer = create_hashed_features(
+                chunks, n_features=hashing['n_features'], tokenizer=tokenizer,
+                executor=executor, analyzer=params['analyzer']
+            )
+        write_features(output_filepath, X, y, 'v1',
+                       feature_names=feature_names)
+        # Artifacts of an earlier 'tfidf' run describe a vocabulary these
+        # features do not use
+        remove_stale_artifacts(Path(output_filepath).parent,
+                               [TERM_STATS_FILENAME, SLIM_VECTORIZER_FILENAME])
+    else:
+        logger.info('Loading processed data')
+        df = read_frame(input_filepath)
+        workers = params['fit_workers']
+        pool = ProcessPoolExecutor(workers) if workers > 1 else nullcontext()
+        with pool as executor:
+            if is_sparse_path(output_filepath):
+                features = create_sparse_features(
+                    df, max_features=params['max_features'],
+                    tokenizer=tokenizer, executor=executor, n_shards=workers,
+                    return_term_stats=True, analyzer=params['analyzer']
+                )
+                X, y, feature_names, vectorizer, term_stats = features
+                write_features(output_filepath, X, y, 'v1',
+                               feature_names=feature_names)
+            else:
+                final_df, vectorizer, term_stats = create_tfidf_features(
+                    df, max_features=params['max_features'],
+                    tokenizer=tokenizer, executor=executor, n_shards=workers,
+                    return_term_stats=True, analyzer=params['analyzer']
+                )
+                write_frame(final_df, output_filepath)
+        term_stats_path = Path(output_filepath).parent / TERM_STATS_FILENAME
+        save_term_stats(term_stats_path, term_stats)
+        logger.info(f'Term statistics saved to {term_stats_path}')
+        if params['slim_vectorizer']:
+            slim_path = Path(output_filepath).parent / SLIM_VECTORIZER_FILENAME
+            export_slim_vectorizer(vectorizer, slim_path)
+            logger.info(f'Compact vectorizer saved to {slim_path}')
+        else:
+            remove_stale_artifacts(Path(output_filepath).parent,
+                                   [SLIM_VECTORIZER_FILENAME])
     logger.info(f'Features built and saved to {output_filepath}')
 
     output_path = Path(output_filepath)
-    vectorizer_path = output_path.parent / 'tfidf_vectorizer.joblib'
+    vectorizer_path = output_path.parent / VECTORIZER_FILENAME
     dump(vectorizer, vectorizer_path)
     logger.info(f'Vectorizer saved to {vectorizer_path}')
 
@@ -0,0 +1,192 @@
+"""
+This module selects the feature columns carrying the most spam signal, between
+build_features and train_model.
+
+Columns are scored on the training rows only (the same split train_model
+makes, from params.yaml), with chi² or the mutual information between term
+presence and the label, and the top `k` are kept. The fitted selector is
+saved next to the selected features, so inference can reduce vectorizer
+output to the same columns (see `build_features.transform_texts`).
+"""
+
+import click
+import json
+import logging
+import time
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+import yaml
+from src.data.split import split_indices
+from src.data.storage import read_features, write_features
+from src.features.feature_scores import SCORE_FUNCTIONS
+
+# Artifact saved next to the selected feature matrix
+SELECTOR_FILENAME = 'feature_selector.joblib'
+
+
+def load_params(params_path):
+    """Load parameters from YAML config file."""
+    with open(params_path, 'r') as f:
+        params = yaml.safe_load(f)
+    return params
+
+
+def fit_selector(X, y, method='chi2', k=1000):
+    """
+    Fit a selector keeping the `k` best scoring feature columns.
+
+    Args:
+        X (scipy.sparse matrix): Training features
+        y (np.ndarray): Training labels
+        method (str): 'chi2' or 'mutual_info'
+        k (int): Number of columns kept; all columns if larger than their
+            number
+
+    Returns:
+        SelectKBest: Fitted selector; `get_support()` is the column mask
+    """
+    from sklearn.feature_selection import SelectKBest
+
+    return SelectKBest(SCORE_FUNCTIONS[method], k=min(k, X.shape[1])).fit(X, y)
+
+
+def evaluate_k_values(X, y, train_idx, test_idx, method, k_values, rf_params):
+    """
+    Train and evaluate the Random Forest on the top-k columns for several k.
+
+    k values above the number of columns are clamped to it, and each
+    distinct k is evaluated once.
+
+    Returns:
+        list: One dict per distinct k with the test accuracy, training
+            seconds, batch prediction microseconds per row and single-row
+            prediction milliseconds
+    """
+    import numpy as np
+
+    from src.models.train_model import predict_latency, train_model_rf
+
+    logger = logging.getLogger(__name__)
+
+    n_columns = X.shape[1]
+    clamped = sorted({k for k in k_values if k > n_columns})
+    if clamped:
+        logger.info(f'k values {clamped} exceed the {n_columns} columns; '
+                    f'evaluating k={n_columns} instead')
+    k_values = sorted({min(k, n_columns) for k in k_values})
+
+    X_train, X_test = X[train_idx], X[test_idx]
+    y_train, y_test = np.asarray(y)[train_idx], np.asarray(y)[test_idx]
+    results = []
+    for k in k_values:
+        selector = fit_selector(X_train, y_train, method=method, k=k)
+        k_train = selector.transform(X_train)
+        k_test = selector.transform(X_test)
+
+        start = time.perf_counter()
+        model = train_model_rf(k_train, y_train, **rf_params)
+        train_seconds = time.perf_counter() - start
+
+        predictions, us_per_row, single_row_ms = predict_latency(model, k_test)
+        results.append({
+            'k': k,
+            'accuracy': float((predictions == y_test).mean()),
+            'train_seconds': train_seconds,
+            'predict_us_per_row': us_per_row,
+            'predict_single_row_ms': single_row_ms,
+        })
+    return results
+
+
+def markdown_report(method, results):
+    """Render the k comparison as a markdown table."""
+    lines = [
+        f'# Feature selection ({method})',
+        '',
+        '| k | accuracy | train (s) | predict (us/row) | '
+        'single-row predict (ms) |',
+        '|---:|---:|---:|---:|---:|',
+    ]
+    for r in results:
+        lines.append(f'| {r["k"]} | {r["accuracy"]:.4f} | '
+                     f'{r["train_seconds"]:.2f} | '
+                     f'{r["predict_us_per_row"]:.2f} | '
+                     f'{r["predict_single_row_ms"]:.2f} |')
+    return '\n'.join(lines) + '\n'
+
+
+@click.command()
+@click.argument('input_filepath', type=click.Path(exists=True))
+@click.argument('output_filepath', type=click.Path())
+@click.option('--report-dir', type=click.Path(file_okay=False), default=None,
+              help='Also compare accuracy, train time and predict latency '
+                   'for the params.yaml report_k values, and write the '
+                   'report there.')
+def main(input_filepath, output_filepath, report_dir):
+    """
+    Keep the top-k feature columns of a feature matrix.
+
+    Args:
+        input_filepath (str): build_features output (.store, .npz, CSV,
+            Parquet or Feather)
+        output_filepath (str): Selected features, in the format of its
+            extension
+        report_dir (str): Optional directory of feature_selection.json/.md
+    """
+    import joblib
+    import numpy as np
+    import scipy.sparse as sp
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+    selection = params['feature_selection']
+    target_column = params['data']['target_column']
+
+    X, y, feature_names = read_features(input_filepath, target_column)
+    X = X if sp.issparse(X) else sp.csr_matrix(X.to_numpy())
+    labels = np.asarray(y)
+    train_idx, test_idx = split_indices(X.shape[0],
+                                        params['data']['test_size'],
+                                        params['data']['random_state'])
+
+    logger.info(f"Scoring {X.shape[1]} columns with {selection['method']} "
+                f'on {len(train_idx)} training rows')
+    selector = fit_selector(X[train_idx], labels[train_idx],
+                            method=selection['method'], k=selection['k'])
+    mask = selector.get_support()
+    selected_names = [name for name, keep in zip(feature_names, mask) if keep]
+    logger.info(f'Keeping {len(selected_names)} of {X.shape[1]} columns')
+
+    write_features(output_filepath, selector.transform(X), labels,
+                   target_column, feature_names=selected_names)
+    selector_path = Path(output_filepath).parent / SELECTOR_FILENAME
+    joblib.dump(selector, selector_path)
+    logger.info(f'Selected features saved to {output_filepath}, selector to '
+                f'{selector_path}')
+
+    if report_dir:
+        method = selection['method']
+        results = evaluate_k_values(X, labels, train_idx, test_idx, method,
+                                    selection['report_k'],
+                                    params['model']['random_forest'])
+        for r in results:
+            logger.info(f'k={r["k"]:>6} | accuracy {r["accuracy"]:.4f} | '
+                        f'train {r["train_seconds"]:6.2f} s | '
+                        f'predict {r["predict_us_per_row"]:7.2f} us/row, '
+                        f'{r["predict_single_row_ms"]:6.2f} ms/call')
+        report_path = Path(report_dir)
+        report_path.mkdir(parents=True, exist_ok=True)
+        with open(report_path / 'feature_selection.json', 'w') as f:
+            json.dump({'method': method, 'results': results}, f, indent=2)
+        (report_path / 'feature_selection.md').write_text(
+            markdown_report(method, results))
+        logger.info(f'Report saved to {report_path}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    load_dotenv(find_dotenv())
+    main()
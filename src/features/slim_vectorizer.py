@@ -0,0 +1,224 @@
+"""
+This module exports a fitted TF-IDF vectorizer to a compact artifact and
+loads it back as a lightweight transformer that needs only numpy and scipy.
+
+The artifact is a single .npz file holding:
+- terms: the vocabulary, sorted, so a term's position is its feature column
+- idf: the IDF weight of every term, as float32
+- config: the analyzer settings as JSON (whitespace splitting of
+  pre-tokenized text, or lowercasing, token pattern and stop words;
+  normalization)
+
+Loading it costs neither unpickling an sklearn object nor importing sklearn,
+which dominate the start-up time of a serving process. `SlimTfidfVectorizer`
+produces the same matrix as the vectorizer it was exported from, up to the
+float32 rounding of the IDF weights.
+
+Convert an existing artifact from the project root:
+    python -m src.features.slim_vectorizer models/tfidf_vectorizer.joblib \
+        models/tfidf_vectorizer.npz
+"""
+
+import click
+import json
+import logging
+import re
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+
+# Compact artifact written next to the pickled vectorizer
+SLIM_VECTORIZER_FILENAME = 'tfidf_vectorizer.npz'
+
+SLIM_VECTORIZER_VERSION = 1
+
+
+def export_slim_vectorizer(vectorizer, path):
+    """
+    Write the compact artifact of a fitted TF-IDF vectorizer.
+
+    Args:
+        vectorizer (TfidfVectorizer): Fitted word-unigram TF-IDF vectorizer
+        path (str or Path): Destination .npz file
+
+    Raises:
+        ValueError: If the vectorizer uses settings the slim transformer does
+            not reproduce (custom analyzer, preprocessor or tokenizer,
+            n-grams, accent stripping, binary counts)
+    """
+    import numpy as np
+
+    if not hasattr(vectorizer, 'vocabulary_'):
+        raise ValueError(
+            "Only fitted 'tfidf' mode vectorizers can be exported")
+    split = vectorizer.analyzer is str.split
+    unsupported = {
+        'analyzer': vectorizer.analyzer != 'word' and not split,
+        'ngram_range': tuple(vectorizer.ngram_range) != (1, 1),
+        'preprocessor': vectorizer.preprocessor is not None,
+        'tokenizer': vectorizer.tokenizer is not None,
+        'strip_accents': vectorizer.strip_accents is not None,
+        'binary': vectorizer.binary,
+    }
+    if any(unsupported.values()):
+        settings = ', '.join(name for name, is_set in unsupported.items()
+                             if is_set)
+        raise ValueError(f'Cannot export a vectorizer with custom {settings}')
+
+    terms = sorted(vectorizer.vocabulary_)
+    columns = np.fromiter((vectorizer.vocabulary_[term] for term in terms),
+                          dtype=np.int64, count=len(terms))
+    if not np.array_equal(columns, np.arange(len(terms))):
+        # The slim transformer numbers columns by sorted term, as sklearn's
+        # fit does
+        raise ValueError('Vectorizer columns are not in sorted term order')
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms))
+
+    config = {
+        'version': SLIM_VECTORIZER_VERSION,
+        'split': split,
+        'lowercase': bool(vectorizer.lowercase) and not split,
+        'token_pattern': vectorizer.token_pattern,
+        'stop_words': ([] if split
+                       else sorted(vectorizer.get_stop_words() or ())),
+        'norm': vectorizer.norm,
+        'sublinear_tf': bool(vectorizer.sublinear_tf),
+    }
+    np.savez_compressed(
+        path,
+        terms=np.array(terms, dtype=str),
+        idf=idf.astype(np.float32),
+        config=np.array(json.dumps(config)),
+    )
+
+
+class SlimTfidfVectorizer:
+    """
+    TF-IDF transformer loaded from the compact artifact.
+
+    Only `transform` is provided: the vocabulary and IDF weights are fixed.
+    """
+
+    def __init__(self, terms, idf, config):
+        self.terms = terms
+        self.idf = idf
+        self.config = config
+        self.vocabulary_ = {term: column for column, term in enumerate(terms)}
+        self.stop_words = frozenset(config['stop_words'])
+        if config.get('split'):
+            self.find_tokens = str.split
+        else:
+            self.find_tokens = re.compile(config['token_pattern']).findall
+
+    @classmethod
+    def load(cls, path):
+        """Load the artifact written by `export_slim_vectorizer`."""
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as artifact:
+            config = json.loads(artifact['config'].item())
+            if config['version'] != SLIM_VECTORIZER_VERSION:
+                raise ValueError('Unsupported slim vectorizer version '
+                                 f"{config['version']} in {path}")
+            return cls(artifact['terms'].tolist(), artifact['idf'], config)
+
+    def analyze(self, text):
+        """
+        Return the vocabulary terms of `text`, as the exported vectorizer's
+        analyzer would.
+        """
+        if self.config['lowercase']:
+            text = text.lower()
+        tokens = self.find_tokens(text)
+        if not self.stop_words:
+            return tokens
+        return [token for token in tokens if token not in self.stop_words]
+
+    def transform(self, texts):
+        """
+        Featurize texts.
+
+        Args:
+            texts (iterable): Processed messages
+
+        Returns:
+            scipy.sparse.csr_matrix: TF-IDF rows of shape (n_texts, n_terms)
+        """
+        import numpy as np
+        import scipy.sparse as sp
+
+        vocabulary = self.vocabulary_
+        indices, counts, indptr = [], [], [0]
+        for text in texts:
+            row = {}
+            for term in self.analyze(text):
+                column = vocabulary.get(term)
+                if column is not None:
+                    row[column] = row.get(column, 0) + 1
+            columns = sorted(row)
+            indices.extend(columns)
+            counts.extend(row[column] for column in columns)
+            indptr.append(len(indices))
+
+        indices = np.asarray(indices, dtype=np.int32)
+        indptr = np.asarray(indptr, dtype=np.int64)
+        data = np.asarray(counts, dtype=np.float64)
+        if self.config['sublinear_tf']:
+            data = np.log(data) + 1
+        data *= self.idf[indices]
+
+        n_rows = len(indptr) - 1
+        if self.config['norm']:
+            rows = np.repeat(np.arange(n_rows), np.diff(indptr))
+            if self.config['norm'] == 'l2':
+                weights = data ** 2
+            else:
+                weights = np.abs(data)
+            norms = np.bincount(rows, weights=weights, minlength=n_rows)
+            if self.config['norm'] == 'l2':
+                norms = np.sqrt(norms)
+            norms[norms == 0] = 1
+            data /= norms[rows]
+        return sp.csr_matrix((data, indices, indptr),
+                             shape=(n_rows, len(self.terms)))
+
+
+def load_vectorizer(path):
+    """Load the compact .npz or the pickled sklearn vectorizer artifact."""
+    if Path(path).suffix == '.npz':
+        return SlimTfidfVectorizer.load(path)
+
+    import joblib
+
+    return joblib.load(path)
+
+
+@click.command()
+@click.argument('vectorizer_path',
+                type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_filepath', type=click.Path(dir_okay=False))
+def main(vectorizer_path, output_filepath):
+    """
+    Export a pickled TF-IDF vectorizer to the compact artifact.
+
+    Args:
+        vectorizer_path (str): tfidf_vectorizer.joblib saved by build_features
+        output_filepath (str): Destination .npz file
+    """
+    import joblib
+
+    logger = logging.getLogger(__name__)
+
+    vectorizer = joblib.load(vectorizer_path)
+    export_slim_vectorizer(vectorizer, output_filepath)
+    logger.info(f'{len(vectorizer.vocabulary_)} terms exported to '
+                f'{output_filepath} '
+                f'({Path(output_filepath).stat().st_size / 1024:.0f} KiB, '
+                f'from {Path(vectorizer_path).stat().st_size / 1024:.0f} KiB)')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    load_dotenv(find_dotenv())
+    main()
@@ -0,0 +1,156 @@
+"""
+This module refreshes a saved TF-IDF vectorizer with a new batch of processed
+messages, without re-reading the corpus it was fitted on.
+
+The term statistics saved by build_features next to the vectorizer are
+updated with the term and document frequencies of the batch; the IDF weights
+and the top `max_features` selection are then recomputed from them, giving
+the vectorizer a full fit on the corpus followed by the batch would give.
+Counting costs time proportional to the batch; re-selecting the vocabulary
+is proportional to the number of distinct terms seen so far.
+"""
+
+import click
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+from src.data.storage import read_frame
+from src.features.build_features import (
+    TERM_STATS_FILENAME,
+    VECTORIZER_FILENAME,
+    analyzer_mode,
+    count_term_frequencies,
+    load_term_stats,
+    save_term_stats,
+    tfidf_from_term_counts,
+)
+from src.features.slim_vectorizer import (SLIM_VECTORIZER_FILENAME,
+                                          export_slim_vectorizer)
+
+
+def update_term_stats(term_stats, texts, executor=None, n_shards=1,
+                      analyzer='regex'):
+    """
+    Fold the term counts of `texts` into saved term statistics.
+
+    Args:
+        term_stats (tuple): (term_frequency, document_frequency, n_documents)
+        texts (list): Processed messages of the new batch
+        executor (concurrent.futures.Executor): Optional pool counting shards
+        n_shards (int): Number of shards when `executor` is given
+        analyzer (str): Analyzer mode the saved statistics were counted with
+
+    Returns:
+        tuple: Updated (term_frequency, document_frequency, n_documents)
+    """
+    term_frequency, document_frequency, n_documents = term_stats
+    batch_tf, batch_df = count_term_frequencies(texts, executor, n_shards,
+                                                analyzer)
+    term_frequency.update(batch_tf)
+    document_frequency.update(batch_df)
+    return term_frequency, document_frequency, n_documents + len(texts)
+
+
+def vocabulary_changes(old_vocabulary, new_vocabulary):
+    """Return the sorted terms that (entered, left) the vocabulary."""
+    entered = sorted(set(new_vocabulary) - set(old_vocabulary))
+    left = sorted(set(old_vocabulary) - set(new_vocabulary))
+    return entered, left
+
+
+def _preview(terms, limit=20):
+    """Join the first `limit` terms for logging."""
+    return ', '.join(terms[:limit]) + (' ...' if len(terms) > limit else '')
+
+
+@click.command()
+@click.argument('vectorizer_path',
+                type=click.Path(exists=True, dir_okay=False))
+@click.argument('batch_filepath', type=click.Path(exists=True))
+@click.option('--output-dir', type=click.Path(file_okay=False), default=None,
+              help='Directory of the updated artifacts; defaults to '
+                   'updating them in place.')
+@click.option('--workers', type=int, default=1, show_default=True,
+              help='Processes counting the batch terms.')
+def main(vectorizer_path, batch_filepath, output_dir, workers):
+    """
+    Update a TF-IDF vectorizer and its term statistics with a new batch.
+
+    Args:
+        vectorizer_path (str): Path to the tfidf_vectorizer.joblib saved by
+            build_features; its term statistics are read from the same
+            directory
+        batch_filepath (str): Processed messages (make_dataset output)
+        output_dir (str): Directory of the updated vectorizer (and its compact
+            artifact, when there is one), term statistics and
+            vocabulary_update.json report
+        workers (int): Processes counting the batch terms
+    """
+    import joblib
+
+    logger = logging.getLogger(__name__)
+
+    vectorizer_dir = Path(vectorizer_path).parent
+    output_path = Path(output_dir) if output_dir else vectorizer_dir
+    term_stats_path = vectorizer_dir / TERM_STATS_FILENAME
+    if not term_stats_path.exists():
+        raise click.ClickException(
+            f'No term statistics at {term_stats_path}; '
+            "rebuild the features in 'tfidf' mode first")
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = joblib.load(vectorizer_path)
+    if not isinstance(vectorizer, TfidfVectorizer):
+        raise click.ClickException(
+            f'{vectorizer_path} holds a {type(vectorizer).__name__}, not a '
+            "TfidfVectorizer; only 'tfidf' mode vectorizers can be updated")
+    analyzer = analyzer_mode(vectorizer)
+    term_stats = load_term_stats(term_stats_path)
+    logger.info(f'Loaded vectorizer fitted on {term_stats[2]} documents '
+                f'({len(term_stats[0])} distinct terms)')
+
+    texts = list(read_frame(batch_filepath, columns=['v2'])['v2'].astype(str))
+    logger.info(f'Folding in {len(texts)} new documents')
+    pool = ProcessPoolExecutor(workers) if workers > 1 else nullcontext()
+    with pool as executor:
+        term_stats = update_term_stats(term_stats, texts, executor,
+                                       n_shards=workers, analyzer=analyzer)
+
+    updated = tfidf_from_term_counts(
+        *term_stats, max_features=vectorizer.max_features, analyzer=analyzer)
+    entered, left = vocabulary_changes(vectorizer.vocabulary_,
+                                       updated.vocabulary_)
+    logger.info(f'{len(entered)} features entered and {len(left)} left the '
+                'vocabulary')
+    if entered:
+        logger.info(f'Entered: {_preview(entered)}')
+    if left:
+        logger.info(f'Left: {_preview(left)}')
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    joblib.dump(updated, output_path / VECTORIZER_FILENAME)
+    save_term_stats(output_path / TERM_STATS_FILENAME, term_stats)
+    if (vectorizer_dir / SLIM_VECTORIZER_FILENAME).exists():
+        export_slim_vectorizer(updated, output_path / SLIM_VECTORIZER_FILENAME)
+    with open(output_path / 'vocabulary_update.json', 'w') as f:
+        json.dump({
+            'batch_documents': len(texts),
+            'total_documents': term_stats[2],
+            'vocabulary_size': len(updated.vocabulary_),
+            'entered': entered,
+            'left': left,
+        }, f, indent=2)
+    logger.info('Updated vectorizer and term statistics saved to '
+                f'{output_path}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    load_dotenv(find_dotenv())
+    main()
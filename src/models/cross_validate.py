@@ -0,0 +1,262 @@
+"""
+This module cross-validates the model families of params.yaml on the
+training split train_model makes, so accuracy differences between models can
+be told from split noise.
+
+Folds are fitted in parallel worker processes (`cross_validation.workers`).
+They do not each receive a copy of the features: a .store feature file is
+memory-mapped by every worker as it is, and other formats are written once,
+as the training split, to a temporary store or .npy file the workers
+memory-map (see `train_model.share_training_data`). Only the fold's row
+indices are sent to a worker.
+
+For every model and fold the accuracy, precision, recall and F1 score of the
+positive (last) class, the fit time and the predict latencies are reported,
+with their mean and standard deviation over the folds.
+"""
+
+import click
+import json
+import logging
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+import yaml
+from src.data.split import select_rows, split_indices
+from src.data.storage import is_store_path, read_features
+from src.models.train_model import (MODEL_TRAINERS, open_training_data,
+                                    predict_latency, share_training_data,
+                                    worker_model_params)
+
+# Outputs written to the output directory
+CV_METRICS_FILENAME = 'cv_metrics.json'
+CV_REPORT_FILENAME = 'cv_report.md'
+
+# Per-fold values summarized over the folds
+FOLD_METRICS = ('accuracy', 'precision', 'recall', 'f1', 'fit_seconds',
+                'predict_us_per_row', 'predict_single_row_ms')
+
+
+def load_params(params_path):
+    """Load parameters from YAML config file."""
+    with open(params_path, 'r') as f:
+        params = yaml.safe_load(f)
+    return params
+
+
+def fold_indices(y, folds, shuffle, random_state):
+    """
+    Split rows into stratified folds.
+
+    Args:
+        y (array-like): Labels of the rows
+        folds (int): Number of folds
+        shuffle (bool): Shuffle the rows of every class before splitting
+        random_state (int): Seed of the shuffle
+
+    Returns:
+        list: (train_positions, test_positions) of every fold, positions
+            into `y`
+    """
+    import numpy as np
+    from sklearn.model_selection import StratifiedKFold
+
+    splitter = StratifiedKFold(folds, shuffle=shuffle,
+                               random_state=random_state if shuffle else None)
+    return list(splitter.split(np.zeros(len(y)), np.asarray(y)))
+
+
+def fit_fold(family, fold, shared, train_rows, test_rows, model_params):
+    """
+    Fit and score one model family on one fold, in a worker process.
+
+    Args:
+        family (str): Key of `MODEL_TRAINERS`
+        fold (int): Fold number, reported back
+        shared (dict): Feature location from `share_training_data`
+        train_rows (np.ndarray): Rows of the shared features the model is
+            fitted on
+        test_rows (np.ndarray): Rows of the shared features it is scored on
+        model_params (dict): Keyword arguments of the training function
+
+    Returns:
+        dict: Scores and timings of the fold
+    """
+    import numpy as np
+    from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+
+    X, y = open_training_data(shared)
+    X_train, y_train = select_rows(X, train_rows), select_rows(y, train_rows)
+    X_test = select_rows(X, test_rows)
+    y_test = np.asarray(select_rows(y, test_rows))
+
+    start = time.perf_counter()
+    model = MODEL_TRAINERS[family](X_train, y_train, **model_params)
+    fit_seconds = time.perf_counter() - start
+    predictions, us_per_row, single_row_ms = predict_latency(model, X_test)
+
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        y_test, predictions, pos_label=model.classes_[-1], average='binary',
+        zero_division=0)
+    return {
+        'model': family,
+        'fold': fold,
+        'accuracy': float(accuracy_score(y_test, predictions)),
+        'precision': float(precision),
+        'recall': float(recall),
+        'f1': float(f1),
+        'fit_seconds': fit_seconds,
+        'predict_us_per_row': us_per_row,
+        'predict_single_row_ms': single_row_ms,
+    }
+
+
+def summarize_folds(results):
+    """
+    Return the mean and standard deviation of every fold metric, by model
+    family.
+    """
+    import numpy as np
+
+    summary = {}
+    for family in dict.fromkeys(result['model'] for result in results):
+        folds = [result for result in results if result['model'] == family]
+        summary[family] = {
+            metric: {'mean': float(np.mean([fold[metric] for fold in folds])),
+                     'std': float(np.std([fold[metric] for fold in folds]))}
+            for metric in FOLD_METRICS
+        }
+    return summary
+
+
+def markdown_report(metrics):
+    """
+    Render the cross-validation summary and per-fold scores as markdown
+    tables.
+    """
+    lines = [
+        f'# Cross-validation ({metrics["folds"]} folds, '
+        f'{metrics["rows"]} training rows)',
+        '',
+        '| model | accuracy | precision | recall | F1 | fit (s) | '
+        'predict (us/row) | single-message predict (ms) |',
+        '|---|---:|---:|---:|---:|---:|---:|---:|',
+    ]
+    for family, m in metrics['summary'].items():
+        scores = ' | '.join(f'{m[name]["mean"]:.4f} ± {m[name]["std"]:.4f}'
+                            for name in ('accuracy', 'precision', 'recall',
+                                         'f1'))
+        lines.append(f'| {family} | {scores} | '
+                     f'{m["fit_seconds"]["mean"]:.2f} | '
+                     f'{m["predict_us_per_row"]["mean"]:.2f} | '
+                     f'{m["predict_single_row_ms"]["mean"]:.3f} |')
+    lines += [
+        '',
+        '| model | fold | accuracy | F1 | fit (s) |',
+        '|---|---:|---:|---:|---:|',
+    ]
+    for fold in metrics['fold_results']:
+        lines.append(f'| {fold["model"]} | {fold["fold"]} | '
+                     f'{fold["accuracy"]:.4f} | {fold["f1"]:.4f} | '
+                     f'{fold["fit_seconds"]:.2f} |')
+    return '\n'.join(lines) + '\n'
+
+
+@click.command()
+@click.argument('input_filepath', type=click.Path(exists=True))
+@click.argument('output_dir', type=click.Path(file_okay=False))
+def main(input_filepath, output_dir):
+    """
+    Cross-validate the model families configured in params.yaml.
+
+    Args:
+        input_filepath (str): Features (.store, sparse .npz, CSV, Parquet or
+            Feather)
+        output_dir (str): Directory of cv_metrics.json and cv_report.md
+    """
+    import numpy as np
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+    cv_params = params['cross_validation']
+    families = cv_params['models']
+
+    X, y, _ = read_features(input_filepath, params['data']['target_column'])
+    train_indices, _ = split_indices(X.shape[0], params['data']['test_size'],
+                                     params['data']['random_state'])
+    y_train = select_rows(y, train_indices)
+    folds = fold_indices(y_train, cv_params['folds'], cv_params['shuffle'],
+                         cv_params['random_state'])
+
+    tasks = []
+    with tempfile.TemporaryDirectory() as shared_dir:
+        if is_store_path(input_filepath):
+            # Workers memory-map the feature file itself; fold rows index
+            # into it
+            shared = {'format': 'store', 'path': str(input_filepath)}
+            rows = train_indices
+        else:
+            shared = share_training_data(
+                shared_dir, select_rows(X, train_indices), y_train)
+            rows = np.arange(len(train_indices))
+        del X, y
+
+        workers = min(cv_params['workers'], len(families) * len(folds))
+        for family in families:
+            model_params = worker_model_params(params['model'][family],
+                                               workers)
+            for fold, (fold_train, fold_test) in enumerate(folds, 1):
+                tasks.append((family, fold, shared, np.sort(rows[fold_train]),
+                              np.sort(rows[fold_test]), model_params))
+
+        logger.info(f'Cross-validating {", ".join(families)} over '
+                    f'{len(folds)} folds of {len(train_indices)} training '
+                    f'rows with {workers} worker(s)')
+        start = time.perf_counter()
+        pool = ProcessPoolExecutor(workers) if workers > 1 else nullcontext()
+        with pool as executor:
+            map_tasks = executor.map if executor is not None else map
+            results = []
+            for result in map_tasks(fit_fold, *zip(*tasks)):
+                logger.info(f'{result["model"]} fold {result["fold"]}: '
+                            f'accuracy {result["accuracy"]:.4f}, '
+                            f'F1 {result["f1"]:.4f}, '
+                            f'fit {result["fit_seconds"]:.2f} s')
+                results.append(result)
+        wall_seconds = time.perf_counter() - start
+
+    summary = summarize_folds(results)
+    for family, m in summary.items():
+        logger.info(f'{family}: accuracy {m["accuracy"]["mean"]:.4f} ± '
+                    f'{m["accuracy"]["std"]:.4f}, '
+                    f'F1 {m["f1"]["mean"]:.4f} ± {m["f1"]["std"]:.4f}')
+    fit_seconds = sum(result['fit_seconds'] for result in results)
+    logger.info(f'{len(results)} fits took {fit_seconds:.2f} s of fitting in '
+                f'{wall_seconds:.2f} s wall time')
+
+    metrics = {
+        'rows': len(train_indices),
+        'folds': len(folds),
+        'workers': workers,
+        'wall_seconds': wall_seconds,
+        'summary': summary,
+        'fold_results': results,
+    }
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    with open(output_path / CV_METRICS_FILENAME, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    (output_path / CV_REPORT_FILENAME).write_text(markdown_report(metrics))
+    logger.info(f'Cross-validation metrics saved to {output_path}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    load_dotenv(find_dotenv())
+    main()
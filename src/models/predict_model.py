@@ -3,14 +3,22 @@ This module handles model evaluation by loading a trained model,
 making predictions on test data, and calculating accuracy scores.
 """
 
-import pandas as pd
 import logging
 from pathlib import Path
-import joblib
 import click
 from dotenv import find_dotenv, load_dotenv
 import yaml
+from src.data.split import read_split, select_rows
 
+# Label of every model class in the accuracy file
+MODEL_LABELS = {
+    'RandomForestClassifier': 'RF',
+    'GradientBoostingClassifier': 'GB',
+    'HistGradientBoostingClassifier': 'GB',
+    'LogisticRegression': 'LogReg',
+    'SGDClassifier': 'SGD',
+    'MultinomialNB': 'NB',
+}
 
 
 def load_params(params_path):
@@ -21,8 +29,16 @@ def load_params(params_path):
 
 def load_model(model_path):
     """Load trained model from disk."""
+    import joblib
     return joblib.load(model_path)
 
+
+def model_label(model):
+    """Return the short label of a trained model (last step of a Pipeline)."""
+    estimator = model.steps[-1][1] if hasattr(model, 'steps') else model
+    name = type(estimator).__name__
+    return MODEL_LABELS.get(name, name)
+
 def make_predictions(model, X_test):
     """Generate predictions using trained model."""
     return model.predict(X_test)
@@ -34,20 +50,23 @@ def evaluate_predictions(y_true, y_pred):
 
 @click.command()
 @click.argument('model_path', type=click.Path(exists=True))
-@click.argument('test_data_path', type=click.Path(exists=True))
+@click.argument('features_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def main(model_path, test_data_path, output_filepath):
+def main(model_path, features_filepath, output_filepath):
     """
     Main function to evaluate model performance.
     
     Args:
         model_path (str): Path to saved model file
-        test_data_path (str): Path to test data CSV
+        features_filepath (str): Feature file the model was trained on (.store
+            feature store, sparse .npz, CSV, Parquet or Feather); its test rows
+            are taken from the split manifest train_model saved next to it
         output_filepath (str): Path to save accuracy results
         
     The function:
-    1. Loads model parameters and test data
-    2. Loads trained model
+    1. Loads model parameters and the test rows of the features, after
+       checking the split manifest against them
+    2. Loads trained model (any family saved by train_model)
     3. Makes predictions on test data
     4. Calculates and saves accuracy score
     """
@@ -56,15 +75,22 @@ def main(model_path, test_data_path, output_filepath):
     params_path = Path(__file__).resolve().parents[2] / 'params.yaml'
     params = load_params(params_path)
     
-    logger.info(f'Loading test data from {test_data_path}')
-    test_df = pd.read_csv(test_data_path)
-    
-    target_column = params['data']['target_column']
-    X_test = test_df.drop([target_column], axis=1)
-    y_test = test_df[target_column]
+    logger.info(f'Loading test rows of {features_filepath}')
+    try:
+        X, y, _, test_indices = read_split(features_filepath,
+                                           params['data']['target_column'])
+    except (FileNotFoundError, ValueError) as e:
+        raise click.ClickException(str(e))
+    X_test = select_rows(X, test_indices)
+    y_test = select_rows(y, test_indices)
     
     logger.info(f'Loading model from {model_path}')
     model = load_model(model_path)
+    n_features = getattr(model, 'n_features_in_', X_test.shape[1])
+    if n_features != X_test.shape[1]:
+        raise click.ClickException(
+            f'{features_filepath} has {X_test.shape[1]} features, the model '
+            f'was trained on {n_features}; run train_model again')
     
     logger.info('Making predictions')
     predictions = make_predictions(model, X_test)
@@ -76,7 +102,7 @@ def main(model_path, test_data_path, output_filepath):
     Path(output_filepath).parent.mkdir(parents=True, exist_ok=True)
     
     with open(output_filepath, 'w') as f:
-        f.write(f'Model Accuracy RF: {accuracy:.4f}')
+        f.write(f'Model Accuracy {model_label(model)}: {accuracy:.4f}')
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -2,18 +2,40 @@
 This module implements model training and evaluation for spam classification.
 It loads features, trains Random Forest and Gradient Boosting classifiers, 
 and evaluates their performance on test data.
+
+The model families listed in params.yaml (`train.models`) are trained
+concurrently, each in its own process (`train.workers`), over one shared
+memory-mapped copy of the training split; the Random Forest additionally
+fits its trees in `n_jobs` threads, capped to cpu_count // workers so the
+processes do not oversubscribe the cores. Besides the tree ensembles, linear
+families (logistic regression, SGD, multinomial naive Bayes) train directly
+on the sparse TF-IDF matrix.
 """
 
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import os
+import tempfile
+import time
 from pathlib import Path
-import joblib
 import click
 from dotenv import find_dotenv, load_dotenv
 import yaml
 import json
+from src.data.split import select_rows, split_indices, write_split_manifest
+from src.data.storage import (read_feature_store, read_features,
+                              write_feature_store)
+from src.models.transforms import densify
+
+# Fit times, predict latencies and test accuracies, saved next to the first
+# model
+TRAIN_METRICS_FILENAME = 'train_metrics.json'
+MODEL_COMPARISON_FILENAME = 'model_comparison.md'
+
+# Model file of the families without an output path argument, next to the
+# first model
+MODEL_FILENAME = '{family}.joblib'
 
 
 def load_params(params_path):
@@ -22,67 +44,358 @@ def load_params(params_path):
         params = yaml.safe_load(f)
     return params
 
-def load_features(features_filepath):
-    """Load feature matrix from CSV file."""
+
+def load_features(features_filepath, target_column):
+    """
+    Load the feature matrix and labels from a .store feature store
+    (memory-mapped), a sparse .npz, or a CSV, Parquet or Feather file.
+
+    Returns:
+        tuple: (X, y, feature_names); X stays sparse for .store and .npz files
+    """
     logger = logging.getLogger(__name__)
     logger.info('Loading features')
-    return pd.read_csv(features_filepath)
+    return read_features(features_filepath, target_column)
 
 
-def train_model_rf(X_train, y_train, n_estimators, random_state, max_depth):
+def train_model_rf(X_train, y_train, n_estimators, random_state, max_depth,
+                   n_jobs=None):
     """
     Train Random Forest classifier.
     
     Args:
-        X_train (pd.DataFrame): Training features
+        X_train (pd.DataFrame or scipy.sparse matrix): Training features
         y_train (pd.Series): Training labels
         n_estimators (int): Number of trees in forest
         random_state (int): Random seed for reproducibility
         max_depth (int): Maximum depth of trees
+        n_jobs (int): Threads fitting trees in parallel (-1: all cores);
+            the fitted forest does not depend on it
         
     Returns:
         RandomForestClassifier: Trained Random Forest model
     """
     logger = logging.getLogger(__name__)
     logger.info('Training Random Forest model')
+    from sklearn.ensemble import RandomForestClassifier
     
     rf_classifier = RandomForestClassifier(
         n_estimators=n_estimators, 
         random_state=random_state,
-        max_depth=max_depth
+        max_depth=max_depth,
+        n_jobs=n_jobs
     )
     
     rf_classifier.fit(X_train, y_train)
     return rf_classifier
 
 
-def train_model_gb(X_train, y_train, n_estimators, random_state, max_depth):
+# Estimator parameter of the params.yaml settings of the 'histogram' backend
+HISTOGRAM_GB_PARAMS = {
+    'n_estimators': 'boosting__max_iter',
+    'max_depth': 'boosting__max_depth',
+    'learning_rate': 'boosting__learning_rate',
+    'random_state': 'boosting__random_state',
+    'early_stopping': 'boosting__early_stopping',
+    'validation_fraction': 'boosting__validation_fraction',
+    'n_iter_no_change': 'boosting__n_iter_no_change',
+    'max_bins': 'boosting__max_bins',
+}
+
+
+def make_gb_classifier(n_estimators, random_state, max_depth,
+                       backend='exact', learning_rate=0.1,
+                       early_stopping=False, validation_fraction=0.1,
+                       n_iter_no_change=10, max_bins=255):
+    """
+    Return the unfitted Gradient Boosting classifier of a backend.
+
+    Args:
+        n_estimators (int): Number of boosting stages (at most, with early
+            stopping)
+        random_state (int): Random seed for reproducibility
+        max_depth (int): Maximum depth of trees
+        backend (str): 'exact' for `GradientBoostingClassifier`, which sorts
+            feature values to find exact splits, or 'histogram' for
+            `HistGradientBoostingClassifier`, which bins every feature into
+            at most `max_bins` values and builds trees on all cores
+        learning_rate (float): Shrinkage of every stage
+        early_stopping (bool): Stop when the loss on a held-out validation
+            split has not improved for `n_iter_no_change` stages
+        validation_fraction (float): Share of the training rows held out
+            for early stopping
+        n_iter_no_change (int): Patience of early stopping, in stages
+        max_bins (int): Bins per feature of the 'histogram' backend
+
+    Returns:
+        Classifier: GradientBoostingClassifier, or a Pipeline densifying its
+            input for the HistGradientBoostingClassifier (which does not take
+            sparse features), so both are used the same way
+    """
+    if backend == 'exact':
+        from sklearn.ensemble import GradientBoostingClassifier
+
+        return GradientBoostingClassifier(
+            n_estimators=n_estimators,
+            random_state=random_state,
+            max_depth=max_depth,
+            learning_rate=learning_rate,
+            validation_fraction=validation_fraction,
+            n_iter_no_change=n_iter_no_change if early_stopping else None
+        )
+
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import FunctionTransformer
+
+    return Pipeline([
+        ('densify', FunctionTransformer(densify)),
+        ('boosting', HistGradientBoostingClassifier(
+            max_iter=n_estimators,
+            random_state=random_state,
+            max_depth=max_depth,
+            learning_rate=learning_rate,
+            early_stopping=early_stopping,
+            validation_fraction=validation_fraction,
+            n_iter_no_change=n_iter_no_change,
+            max_bins=max_bins
+        )),
+    ])
+
+
+def train_model_gb(X_train, y_train, n_estimators, random_state, max_depth,
+                   **boosting_params):
     """
     Train Gradient Boosting classifier.
     
     Args:
-        X_train (pd.DataFrame): Training features
+        X_train (pd.DataFrame or scipy.sparse matrix): Training features
         y_train (pd.Series): Training labels
         n_estimators (int): Number of boosting stages
         random_state (int): Random seed for reproducibility
         max_depth (int): Maximum depth of trees
+        **boosting_params: Backend and early stopping settings, see
+            `make_gb_classifier`
         
     Returns:
-        GradientBoostingClassifier: Trained Gradient Boosting model
+        Classifier: Trained Gradient Boosting model
     """
     logger = logging.getLogger(__name__)
-    logger.info('Training GradientBoosting model')
-    
-    gb_classifier = GradientBoostingClassifier(
-        n_estimators=n_estimators, 
-        random_state=random_state,
-        max_depth=max_depth
-    )
-    
+    backend = boosting_params.get('backend', 'exact')
+    logger.info(f'Training GradientBoosting model ({backend} backend)')
+
+    gb_classifier = make_gb_classifier(n_estimators, random_state, max_depth,
+                                       **boosting_params)
     gb_classifier.fit(X_train, y_train)
+    if backend == 'histogram' and boosting_params.get('early_stopping'):
+        logger.info('Early stopping after '
+                    f"{gb_classifier['boosting'].n_iter_} of {n_estimators} "
+                    'stages')
     return gb_classifier
 
 
+# Model families fitted behind a MaxAbsScaler, see `make_linear_classifier`
+LINEAR_FAMILIES = ('logistic_regression', 'sgd', 'naive_bayes')
+
+
+def make_linear_classifier(family, **model_params):
+    """
+    Return the unfitted classifier of a linear model family.
+
+    The TF-IDF columns are L2-normalised per row while `num_words` is a raw
+    count, so every column is first scaled by its maximum absolute value
+    (`MaxAbsScaler`, which keeps sparse input sparse and non-negative input
+    non-negative); otherwise `num_words` dominates the linear models.
+
+    Args:
+        family (str): One of `LINEAR_FAMILIES`
+        **model_params: Keyword arguments of the classifier
+
+    Returns:
+        Pipeline: 'scale' (MaxAbsScaler) and 'classifier' steps
+    """
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import MaxAbsScaler
+
+    classifiers = {
+        'logistic_regression': LogisticRegression,
+        'sgd': SGDClassifier,
+        'naive_bayes': MultinomialNB,
+    }
+    return Pipeline([
+        ('scale', MaxAbsScaler()),
+        ('classifier', classifiers[family](**model_params)),
+    ])
+
+
+def train_model_logreg(X_train, y_train, C, max_iter, random_state):
+    """
+    Train logistic regression classifier.
+
+    Args:
+        X_train (pd.DataFrame or scipy.sparse matrix): Training features
+        y_train (pd.Series): Training labels
+        C (float): Inverse of the L2 regularization strength
+        max_iter (int): Maximum number of solver iterations
+        random_state (int): Random seed for reproducibility
+
+    Returns:
+        Pipeline: Scaler and trained logistic regression model, see
+            `make_linear_classifier`
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Training logistic regression model')
+
+    logreg_classifier = make_linear_classifier(
+        'logistic_regression', C=C, max_iter=max_iter,
+        random_state=random_state)
+    logreg_classifier.fit(X_train, y_train)
+    return logreg_classifier
+
+
+def train_model_sgd(X_train, y_train, loss, alpha, max_iter, random_state):
+    """
+    Train linear classifier with stochastic gradient descent.
+
+    Args:
+        X_train (pd.DataFrame or scipy.sparse matrix): Training features
+        y_train (pd.Series): Training labels
+        loss (str): Loss function, e.g. 'hinge' (linear SVM) or 'log_loss'
+        alpha (float): L2 regularization strength
+        max_iter (int): Maximum number of passes over the training data
+        random_state (int): Random seed for reproducibility
+
+    Returns:
+        Pipeline: Scaler and trained SGD model, see `make_linear_classifier`
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Training SGD model')
+
+    sgd_classifier = make_linear_classifier('sgd', loss=loss, alpha=alpha,
+                                            max_iter=max_iter,
+                                            random_state=random_state)
+    sgd_classifier.fit(X_train, y_train)
+    return sgd_classifier
+
+
+def train_model_nb(X_train, y_train, alpha):
+    """
+    Train multinomial naive Bayes classifier.
+
+    Args:
+        X_train (pd.DataFrame or scipy.sparse matrix): Training features
+            (non-negative)
+        y_train (pd.Series): Training labels
+        alpha (float): Additive smoothing of the feature counts
+
+    Returns:
+        Pipeline: Scaler and trained naive Bayes model, see
+            `make_linear_classifier`
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Training multinomial naive Bayes model')
+
+    nb_classifier = make_linear_classifier('naive_bayes', alpha=alpha)
+    nb_classifier.fit(X_train, y_train)
+    return nb_classifier
+
+
+# Training function of each model family
+MODEL_TRAINERS = {
+    'random_forest': train_model_rf,
+    'gradient_boosting': train_model_gb,
+    'logistic_regression': train_model_logreg,
+    'sgd': train_model_sgd,
+    'naive_bayes': train_model_nb,
+}
+
+
+def share_training_data(directory, X_train, y_train):
+    """
+    Write the training split to `directory` for worker processes to memory-map.
+
+    Sparse features are written as a feature store; dense frames as a float32
+    .npy file (the dtype the tree models train on) and their column names.
+
+    Returns:
+        dict: Location of the shared data, as taken by `open_training_data`
+    """
+    import numpy as np
+    import scipy.sparse as sp
+
+    directory = Path(directory)
+    if sp.issparse(X_train):
+        path = directory / 'train.store'
+        feature_names = [str(i) for i in range(X_train.shape[1])]
+        write_feature_store(path, X_train, y_train, 'label',
+                            feature_names=feature_names)
+        return {'format': 'store', 'path': str(path)}
+
+    np.save(directory / 'X_train.npy', X_train.to_numpy(dtype=np.float32))
+    np.save(directory / 'y_train.npy', np.asarray(y_train))
+    return {'format': 'dense', 'path': str(directory),
+            'columns': list(X_train.columns)}
+
+
+def open_training_data(shared):
+    """
+    Memory-map the training split written by `share_training_data`; returns
+    (X_train, y_train).
+    """
+    if shared['format'] == 'store':
+        X_train, y_train, _ = read_feature_store(shared['path'])
+        return X_train, y_train
+
+    import numpy as np
+    import pandas as pd
+
+    directory = Path(shared['path'])
+    X_train = pd.DataFrame(np.load(directory / 'X_train.npy', mmap_mode='r'),
+                           columns=shared['columns'], copy=False)
+    return X_train, np.load(directory / 'y_train.npy', mmap_mode='r')
+
+
+def worker_model_params(model_params, workers):
+    """
+    Cap the `n_jobs` threads of a model family to its share of the cores
+    when `workers` processes fit models concurrently.
+
+    Args:
+        model_params (dict): Keyword arguments of the training function
+        workers (int): Number of worker processes
+
+    Returns:
+        dict: `model_params`, with `n_jobs` at most cpu_count // workers
+    """
+    if workers <= 1 or 'n_jobs' not in model_params:
+        return model_params
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    n_jobs = model_params['n_jobs']
+    if n_jobs is None or 0 < n_jobs <= threads:
+        return model_params
+    return {**model_params, 'n_jobs': threads}
+
+
+def fit_model_family(family, shared, model_params):
+    """
+    Fit one model family on the shared training split, in a worker process.
+
+    Args:
+        family (str): Key of `MODEL_TRAINERS`
+        shared (dict): Training data location from `share_training_data`
+        model_params (dict): Keyword arguments of the training function
+
+    Returns:
+        tuple: (model, fit_seconds)
+    """
+    X_train, y_train = open_training_data(shared)
+    start = time.perf_counter()
+    model = MODEL_TRAINERS[family](X_train, y_train, **model_params)
+    return model, time.perf_counter() - start
+
+
 def evaluate_model(model, X_test, y_test):
     """Evaluate model performance on test data."""
     logger = logging.getLogger(__name__)
@@ -95,6 +408,48 @@ def evaluate_model(model, X_test, y_test):
     return accuracy
 
 
+def predict_latency(model, X_test, single_rows=50):
+    """
+    Time batch and single-message predictions.
+
+    Args:
+        model: Fitted classifier
+        X_test (pd.DataFrame or scipy.sparse matrix): Test features
+        single_rows (int): Number of one-row predict calls timed
+
+    Returns:
+        tuple: (predictions, batch microseconds per row, milliseconds per
+            single-row call)
+    """
+    start = time.perf_counter()
+    predictions = model.predict(X_test)
+    batch_seconds = time.perf_counter() - start
+
+    rows = [X_test[i:i + 1] for i in range(min(single_rows, X_test.shape[0]))]
+    start = time.perf_counter()
+    for row in rows:
+        model.predict(row)
+    single_seconds = (time.perf_counter() - start) / max(1, len(rows))
+    us_per_row = batch_seconds / X_test.shape[0] * 1e6
+    return predictions, us_per_row, single_seconds * 1e3
+
+
+def markdown_comparison(metrics):
+    """Render the trained model families as a markdown table."""
+    lines = [
+        '# Model comparison',
+        '',
+        '| model | accuracy | fit (s) | predict (us/row) | '
+        'single-message predict (ms) |',
+        '|---|---:|---:|---:|---:|',
+    ]
+    for family, m in metrics['models'].items():
+        lines.append(f'| {family} | {m["accuracy"]:.4f} | '
+                     f'{m["fit_seconds"]:.2f} | '
+                     f'{m["predict_us_per_row"]:.2f} | '
+                     f'{m["predict_single_row_ms"]:.3f} |')
+    return '\n'.join(lines) + '\n'
+
 
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
@@ -105,67 +460,95 @@ def main(input_filepath, output_filepath, output_filepath2):
     Main function to train and evaluate models.
     
     Args:
-        input_filepath (str): Path to input features file
+        input_filepath (str): Path to input features file (.store, sparse
+            .npz, CSV, Parquet or Feather); the train/test split is recorded
+            next to it as a manifest of row indices (see `src.data.split`)
         output_filepath (str): Path to save Random Forest model
         output_filepath2 (str): Path to save Gradient Boosting model
         
     The function:
     1. Loads model parameters and feature data
     2. Splits data into train/test sets
-    3. Trains Random Forest and optionally Gradient Boosting models
+    3. Trains the Random Forest and Gradient Boosting models configured in
+       `train.models`, concurrently
     4. Evaluates model performance
-    5. Saves trained models
+    5. Saves trained models, and their fit times, predict latencies and
+       accuracies to train_metrics.json and model_comparison.md next to the
+       Random Forest model; families other than the Random Forest and
+       Gradient Boosting are saved there as <family>.joblib
     """
+    # Heavy imports are deferred so that `--help` and module imports stay fast
+    import joblib
+
     logger = logging.getLogger(__name__)
     
     params_path = Path(__file__).resolve().parents[2] / 'params.yaml'
     params = load_params(params_path)
     
-    final_df = load_features(input_filepath)
-    
     target_column = params['data']['target_column']
-    X = final_df.drop([target_column], axis=1)
-    y = final_df[target_column]
+    X, y, feature_names = load_features(input_filepath, target_column)
     
     logger.info('Splitting data into train and test sets')
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, 
-        test_size=params['data']['test_size'], 
-        random_state=params['data']['random_state']
-    )
-    
-    test_data = pd.concat([X_test, y_test], axis=1)
-    test_data_path = Path(input_filepath).parent / 'test_data.csv'
-    logger.info(f'Saving test data to {test_data_path}')
-    test_data.to_csv(test_data_path, index=False)
-    
-    model = train_model_rf(
-        X_train, 
-        y_train, 
-        n_estimators=params['model']['random_forest']['n_estimators'],
-        random_state=params['model']['random_forest']['random_state'],
-        max_depth=params['model']['random_forest']['max_depth']
-    )
+    test_size = params['data']['test_size']
+    random_state = params['data']['random_state']
+    train_indices, test_indices = split_indices(X.shape[0], test_size,
+                                                random_state)
+    X_train = select_rows(X, train_indices)
+    X_test = select_rows(X, test_indices)
+    y_train = select_rows(y, train_indices)
+    y_test = select_rows(y, test_indices)
 
-    # model_2 = train_model_gb(
-    #     X_train,
-    #     y_train, 
-    #     n_estimators=params['model']['gradient_boosting']['n_estimators'], 
-    #     random_state=params['model']['gradient_boosting']['random_state'], 
-    #     max_depth=params['model']['gradient_boosting']['max_depth']
-    # )
+    manifest_path = write_split_manifest(
+        input_filepath, X, y, feature_names, train_indices, test_indices,
+        test_size, random_state)
+    logger.info(f'Split manifest saved to {manifest_path}')
     
-    # Evaluate model
-    accuracy = evaluate_model(model, X_test, y_test)
-    
-    # Save the model
-    logger.info(f'Saving model to {output_filepath}')
-    Path(output_filepath).parent.mkdir(parents=True, exist_ok=True)
-    joblib.dump(model, output_filepath)
-
-    # logger.info(f'Saving model to {output_filepath2}')
-    # Path(output_filepath2).parent.mkdir(parents=True, exist_ok=True)
-    # joblib.dump(model_2, output_filepath2)
+    output_paths = {'random_forest': output_filepath,
+                    'gradient_boosting': output_filepath2}
+    for family in MODEL_TRAINERS:
+        output_paths.setdefault(family, Path(output_filepath).parent
+                                / MODEL_FILENAME.format(family=family))
+    families = params['train']['models']
+    workers = min(params['train']['workers'], len(families))
+    metrics = {'workers': workers, 'models': {}}
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as shared_dir:
+        shared = share_training_data(shared_dir, X_train, y_train)
+        del X_train
+        logger.info(f'Training {", ".join(families)} with {workers} worker(s)')
+        pool = ProcessPoolExecutor(workers) if workers > 1 else nullcontext()
+        with pool as executor:
+            map_families = executor.map if executor is not None else map
+            fitted = list(map_families(
+                fit_model_family, families, [shared] * len(families),
+                [worker_model_params(params['model'][family], workers)
+                 for family in families]))
+    metrics['wall_seconds'] = time.perf_counter() - start
+
+    for family, (model, fit_seconds) in zip(families, fitted):
+        logger.info(f'{family} fitted in {fit_seconds:.2f} s')
+        accuracy = evaluate_model(model, X_test, y_test)
+        _, us_per_row, single_row_ms = predict_latency(model, X_test)
+
+        model_path = output_paths[family]
+        logger.info(f'Saving model to {model_path}')
+        Path(model_path).parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(model, model_path)
+        metrics['models'][family] = {
+            'path': str(model_path),
+            'fit_seconds': fit_seconds,
+            'accuracy': float(accuracy),
+            'predict_us_per_row': us_per_row,
+            'predict_single_row_ms': single_row_ms,
+        }
+
+    metrics_path = Path(output_filepath).parent / TRAIN_METRICS_FILENAME
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    (metrics_path.parent / MODEL_COMPARISON_FILENAME).write_text(
+        markdown_comparison(metrics))
+    logger.info(f'Trained in {metrics["wall_seconds"]:.2f} s wall time; '
+                f'metrics saved to {metrics_path}')
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
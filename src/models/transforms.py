@@ -0,0 +1,8 @@
+"""Feature transforms used as pipeline steps of the saved models."""
+
+
+def densify(X):
+    """Return sparse features as a dense array; dense ones are unchanged."""
+    import scipy.sparse as sp
+
+    return X.toarray() if sp.issparse(X) else X
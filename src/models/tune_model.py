@@ -0,0 +1,238 @@
+"""
+This module searches the model hyperparameters over the grids of params.yaml
+(`tune.search_space`) with successive halving.
+
+Every candidate is first cross-validated with a small budget (a subsample of
+the training rows, or few trees when the resource is `n_estimators`); only
+the best `1 / factor` of them go on to the next round, with `factor` times
+the budget. Candidates are fitted in parallel (`tune.workers`) on the one
+feature matrix loaded by the stage, which worker processes memory-map.
+
+Only the training split train_model makes is used, so the test split stays
+unseen. The best parameters are written as a params file with the layout of
+the `model` section of params.yaml, next to a leaderboard of score versus
+fit time.
+"""
+
+import click
+import json
+import logging
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+import yaml
+from src.data.split import select_rows, split_indices
+from src.data.storage import read_features
+from src.models.train_model import (
+    HISTOGRAM_GB_PARAMS,
+    LINEAR_FAMILIES,
+    make_gb_classifier,
+    make_linear_classifier,
+)
+
+# Outputs written to the output directory
+BEST_PARAMS_FILENAME = 'best_params.yaml'
+LEADERBOARD_FILENAME = 'leaderboard'
+
+
+def load_params(params_path):
+    """Load parameters from YAML config file."""
+    with open(params_path, 'r') as f:
+        params = yaml.safe_load(f)
+    return params
+
+
+def make_estimator(family, model_params):
+    """Return the unfitted classifier of a model family with `model_params`."""
+    if family == 'gradient_boosting':
+        return make_gb_classifier(**model_params)
+    if family in LINEAR_FAMILIES:
+        return make_linear_classifier(family, **model_params)
+
+    from sklearn.ensemble import RandomForestClassifier
+
+    return RandomForestClassifier(**model_params)
+
+
+def estimator_param_names(family, model_params):
+    """
+    Return the estimator parameter of every params.yaml setting the search
+    may vary.
+    """
+    histogram = model_params.get('backend') == 'histogram'
+    if family == 'gradient_boosting' and histogram:
+        return HISTOGRAM_GB_PARAMS
+    if family in LINEAR_FAMILIES:
+        return {name: f'classifier__{name}' for name in model_params}
+    return {}
+
+
+def make_search(family, model_params, search_space, tune_params):
+    """
+    Build the successive halving search of a model family.
+
+    Args:
+        family (str): Model family of params.yaml `model`
+        model_params (dict): Fixed parameters of the model (params.yaml
+            `model`)
+        search_space (dict): Candidate values of every searched parameter
+        tune_params (dict): params.yaml `tune` section
+
+    Returns:
+        HalvingGridSearchCV: Unfitted search. When the resource is a model
+            parameter (e.g. `n_estimators`), its grid values set the budget
+            of the first and last rounds instead of being searched
+    """
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingGridSearchCV
+
+    names = estimator_param_names(family, model_params)
+    grid = {names.get(name, name): values
+            for name, values in search_space.items()}
+    resource = names.get(tune_params['resource'], tune_params['resource'])
+    budget = {'min_resources': tune_params['min_resources']}
+    if resource != 'n_samples':
+        values = grid.pop(resource)
+        budget = {'min_resources': min(values), 'max_resources': max(values)}
+
+    if family == 'random_forest':
+        model_params = {**model_params, 'n_jobs': 1}
+    estimator = make_estimator(family, model_params)
+    return HalvingGridSearchCV(
+        estimator,
+        grid,
+        factor=tune_params['factor'],
+        resource=resource,
+        cv=tune_params['cv'],
+        scoring='accuracy',
+        refit=False,
+        random_state=tune_params['random_state'],
+        n_jobs=tune_params['workers'],
+        **budget,
+    )
+
+
+def leaderboard(search):
+    """
+    Return one row per candidate, from the last round it reached.
+
+    Rows are sorted by round, then mean cross-validated accuracy, so the
+    first row is the best candidate.
+    """
+    results = search.cv_results_
+    last_round = {}
+    for i, params in enumerate(results['params']):
+        # The resource varies between rounds when it is a model parameter
+        key = json.dumps({name: value for name, value in params.items()
+                          if name != search.resource}, sort_keys=True)
+        if (key not in last_round
+                or results['iter'][i] > results['iter'][last_round[key]]):
+            last_round[key] = i
+
+    rows = [{
+        'params': results['params'][i],
+        'round': int(results['iter'][i]),
+        'resources': int(results['n_resources'][i]),
+        'mean_accuracy': float(results['mean_test_score'][i]),
+        'std_accuracy': float(results['std_test_score'][i]),
+        'mean_fit_seconds': float(results['mean_fit_time'][i]),
+    } for i in last_round.values()]
+    return sorted(rows, key=lambda row: (-row['round'], -row['mean_accuracy']))
+
+
+def markdown_leaderboard(family, resource, rows):
+    """Render the leaderboard as a markdown table."""
+    lines = [
+        f'# Hyperparameter search ({family}, successive halving over '
+        f'{resource})',
+        '',
+        '| rank | parameters | round | resources | accuracy | fit (s) |',
+        '|---:|---|---:|---:|---:|---:|',
+    ]
+    for rank, row in enumerate(rows, 1):
+        params = ', '.join(f'{name}={value}'
+                           for name, value in row['params'].items())
+        lines.append(f'| {rank} | {params} | {row["round"]} | '
+                     f'{row["resources"]} | '
+                     f'{row["mean_accuracy"]:.4f} ± '
+                     f'{row["std_accuracy"]:.4f} | '
+                     f'{row["mean_fit_seconds"]:.2f} |')
+    return '\n'.join(lines) + '\n'
+
+
+@click.command()
+@click.argument('input_filepath', type=click.Path(exists=True))
+@click.argument('output_dir', type=click.Path(file_okay=False))
+def main(input_filepath, output_dir):
+    """
+    Search the hyperparameters of the model family configured in params.yaml.
+
+    Args:
+        input_filepath (str): Features (.store, sparse .npz, CSV, Parquet or
+            Feather)
+        output_dir (str): Directory of best_params.yaml and
+            leaderboard.json/.md
+    """
+    import numpy as np
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+    tune_params = params['tune']
+    family = tune_params['model']
+    model_params = params['model'][family]
+
+    X, y, _ = read_features(input_filepath, params['data']['target_column'])
+    train_indices, _ = split_indices(X.shape[0], params['data']['test_size'],
+                                     params['data']['random_state'])
+    X_train = select_rows(X, train_indices)
+    y_train = select_rows(y, train_indices)
+
+    search = make_search(family, model_params,
+                         tune_params['search_space'][family], tune_params)
+    n_candidates = int(np.prod([len(values)
+                                for values in search.param_grid.values()]))
+    logger.info(f'Searching {n_candidates} {family} candidates on '
+                f'{X_train.shape[0]} training rows, halving over '
+                f'{tune_params["resource"]} with {tune_params["workers"]} '
+                'worker(s)')
+    search.fit(X_train, y_train)
+
+    # Report parameters under their params.yaml names
+    param_names = estimator_param_names(family, model_params)
+    settings = {name: setting for setting, name in param_names.items()}
+    rows = leaderboard(search)
+    for row in rows:
+        row['params'] = {settings.get(name, name): value
+                         for name, value in row['params'].items()}
+    for rank, row in enumerate(rows[:10], 1):
+        logger.info(f'{rank:>3}. accuracy {row["mean_accuracy"]:.4f} | '
+                    f'fit {row["mean_fit_seconds"]:6.2f} s | '
+                    f'round {row["round"]} ({row["resources"]} '
+                    f'{tune_params["resource"]}) | {row["params"]}')
+
+    best = dict(search.best_params_)
+    if tune_params['resource'] != 'n_samples':
+        # The budget the winner was evaluated with in the last round
+        best[search.resource] = int(search.n_resources_[-1])
+    best = {settings.get(name, name): value for name, value in best.items()}
+    best_params = {'model': {family: {**model_params, **best}}}
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    with open(output_path / BEST_PARAMS_FILENAME, 'w') as f:
+        yaml.safe_dump(best_params, f, sort_keys=False)
+    with open(output_path / f'{LEADERBOARD_FILENAME}.json', 'w') as f:
+        json.dump({'model': family, 'resource': tune_params['resource'],
+                   'candidates': rows}, f, indent=2)
+    (output_path / f'{LEADERBOARD_FILENAME}.md').write_text(
+        markdown_leaderboard(family, tune_params['resource'], rows))
+    logger.info(f'Best parameters {best} saved to '
+                f'{output_path / BEST_PARAMS_FILENAME}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    load_dotenv(find_dotenv())
+    main()
@@ -0,0 +1,207 @@
+"""
+This module updates a trained Random Forest with a batch of newly labelled
+messages instead of refitting it on the whole feature file.
+
+The forest is warm-started: `update.add_trees` new trees are fitted on the
+batch only and appended to the existing ones, and when `update.max_trees` is
+set the oldest trees beyond it are retired, so the forest tracks the most
+recent data. The batch must be featurized like the feature file the forest
+was trained on (same vectorizer and selected columns).
+
+The updated forest is evaluated on the held-out rows of the split manifest
+train_model saved next to the feature file. With `--refit` (the default) a
+forest of the same size is also refitted from scratch on the training rows
+plus the batch, to report the training time the update saved.
+
+Run from the project root:
+    python -m src.models.update_model models/random_forest_spam.joblib \
+        data/interim/spam_features_selected.store \
+        data/interim/batch_features.store models/random_forest_spam.joblib
+"""
+
+import click
+import json
+import logging
+import time
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+import yaml
+from src.data.split import read_split, select_rows
+from src.data.storage import read_features
+from src.models.train_model import train_model_rf
+
+# Update report, saved next to the updated model
+UPDATE_METRICS_FILENAME = 'update_metrics.json'
+
+
+def load_params(params_path):
+    """Load parameters from YAML config file."""
+    with open(params_path, 'r') as f:
+        params = yaml.safe_load(f)
+    return params
+
+
+def add_trees(forest, X_batch, y_batch, n_trees, max_trees=None):
+    """
+    Fit new trees of a Random Forest on a batch, keeping the existing ones.
+
+    Args:
+        forest (RandomForestClassifier): Fitted forest, updated in place
+        X_batch (pd.DataFrame or scipy.sparse matrix): Features of the batch
+        y_batch (array-like): Labels of the batch; every class of the forest
+            must occur in it
+        n_trees (int): Number of trees fitted on the batch
+        max_trees (int): Forest size above which the oldest trees are
+            retired (None: keep all)
+
+    Returns:
+        int: Number of trees retired
+
+    Raises:
+        ValueError: If the batch does not match the forest's features or
+            classes
+    """
+    import numpy as np
+
+    if X_batch.shape[1] != forest.n_features_in_:
+        raise ValueError(f'The batch has {X_batch.shape[1]} features, the '
+                         f'forest was trained on {forest.n_features_in_}')
+    batch_classes = np.unique(np.asarray(y_batch))
+    if not np.array_equal(batch_classes, forest.classes_):
+        # New trees would number the classes differently from the existing ones
+        raise ValueError(f'The batch has classes {batch_classes.tolist()}, '
+                         f'the forest {forest.classes_.tolist()}')
+
+    forest.set_params(warm_start=True,
+                      n_estimators=len(forest.estimators_) + n_trees)
+    forest.fit(X_batch, y_batch)
+    forest.set_params(warm_start=False)
+
+    retired = 0
+    if max_trees is not None and len(forest.estimators_) > max_trees:
+        # Trees are kept in the order they were fitted
+        retired = len(forest.estimators_) - max_trees
+        del forest.estimators_[:retired]
+        forest.set_params(n_estimators=max_trees)
+    return retired
+
+
+def stack_rows(X, X_batch):
+    """Append the rows of `X_batch` to `X` (sparse matrices or dataframes)."""
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        return sp.vstack([X, X_batch], format='csr')
+
+    import pandas as pd
+
+    return pd.concat([X, X_batch], ignore_index=True)
+
+
+@click.command()
+@click.argument('model_path', type=click.Path(exists=True))
+@click.argument('features_filepath', type=click.Path(exists=True))
+@click.argument('batch_filepath', type=click.Path(exists=True))
+@click.argument('output_filepath', type=click.Path())
+@click.option('--refit/--no-refit', default=True, show_default=True,
+              help='Also refit the forest from scratch on the training rows '
+                   'and the batch, to compare.')
+def main(model_path, features_filepath, batch_filepath, output_filepath,
+         refit):
+    """
+    Add trees fitted on a new batch to a trained Random Forest.
+
+    Args:
+        model_path (str): Random Forest saved by train_model
+        features_filepath (str): Feature file the forest was trained on; its
+            held-out rows are taken from the split manifest saved next to it
+        batch_filepath (str): Features of the newly labelled messages, in the
+            same columns and format family
+        output_filepath (str): Path to save the updated model (may be
+            MODEL_PATH)
+        refit (bool): Time a full refit of the same forest size for comparison
+    """
+    import joblib
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params(Path(__file__).resolve().parents[2] / 'params.yaml')
+    target_column = params['data']['target_column']
+    update_params = params['update']
+
+    forest = joblib.load(model_path)
+    if not isinstance(forest, RandomForestClassifier):
+        raise click.ClickException(
+            f'{model_path} is a {type(forest).__name__}; '
+            'only Random Forest models can be updated')
+
+    try:
+        X, y, train_indices, test_indices = read_split(features_filepath,
+                                                       target_column)
+    except (FileNotFoundError, ValueError) as e:
+        raise click.ClickException(str(e))
+    X_test = select_rows(X, test_indices)
+    y_test = select_rows(y, test_indices)
+    X_batch, y_batch, _ = read_features(batch_filepath, target_column)
+
+    metrics = {
+        'batch_rows': X_batch.shape[0],
+        'trees_before': len(forest.estimators_),
+        'accuracy_before': float(forest.score(X_test, y_test)),
+    }
+    logger.info(f'Adding {update_params["add_trees"]} trees fitted on '
+                f'{X_batch.shape[0]} new rows to a forest of '
+                f'{len(forest.estimators_)}')
+    start = time.perf_counter()
+    try:
+        retired = add_trees(forest, X_batch, y_batch,
+                            update_params['add_trees'],
+                            update_params['max_trees'])
+    except ValueError as e:
+        raise click.ClickException(f'{batch_filepath}: {e}')
+    metrics['update_seconds'] = time.perf_counter() - start
+    metrics['trees_retired'] = retired
+    metrics['trees_after'] = len(forest.estimators_)
+    metrics['accuracy_after'] = float(forest.score(X_test, y_test))
+    logger.info(f'Updated in {metrics["update_seconds"]:.2f} s ({retired} '
+                'oldest trees retired): held-out accuracy '
+                f'{metrics["accuracy_before"]:.4f} -> '
+                f'{metrics["accuracy_after"]:.4f}')
+
+    if refit:
+        X_train = stack_rows(select_rows(X, train_indices), X_batch)
+        y_train = np.concatenate([np.asarray(select_rows(y, train_indices)),
+                                  np.asarray(y_batch)])
+        logger.info(f'Refitting {len(forest.estimators_)} trees from scratch '
+                    f'on {X_train.shape[0]} rows')
+        start = time.perf_counter()
+        rf_params = {**params['model']['random_forest'],
+                     'n_estimators': len(forest.estimators_)}
+        refitted = train_model_rf(X_train, y_train, **rf_params)
+        metrics['refit_seconds'] = time.perf_counter() - start
+        metrics['refit_accuracy'] = float(refitted.score(X_test, y_test))
+        metrics['seconds_saved'] = (metrics['refit_seconds']
+                                    - metrics['update_seconds'])
+        speedup = metrics['refit_seconds'] / metrics['update_seconds']
+        logger.info(f'Full refit took {metrics["refit_seconds"]:.2f} s '
+                    f'(held-out accuracy {metrics["refit_accuracy"]:.4f}); '
+                    f'the update saved {metrics["seconds_saved"]:.2f} s '
+                    f'({speedup:.1f}x faster)')
+
+    Path(output_filepath).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(forest, output_filepath)
+    metrics_path = Path(output_filepath).parent / UPDATE_METRICS_FILENAME
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    logger.info(f'Updated model saved to {output_filepath}, metrics to '
+                f'{metrics_path}')
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    load_dotenv(find_dotenv())
+    main()
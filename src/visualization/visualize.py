@@ -4,10 +4,6 @@ This module creates visualizations for spam classification data analysis:
 - Top frequent words in spam and non-spam messages
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import numpy as np
-import pandas as pd
 import logging
 from pathlib import Path
 import yaml
@@ -15,7 +11,7 @@ import click
 import re
 from collections import Counter
 from dotenv import find_dotenv, load_dotenv
-import dvclive
+from src.data.storage import read_frame
 
 
 
@@ -27,6 +23,8 @@ def load_params(params_path):
 
 def plot_data_balance(df, output_path, target_column):
    """Create bar plot showing distribution of spam vs non-spam messages."""
+   import matplotlib.pyplot as plt
+
    value_counts = df[target_column].value_counts()
    
    plt.figure(figsize=(6, 4))
@@ -70,6 +68,10 @@ def plot_top_words(df, output_path, label, title):
        label (int): Label value to analyze (0 for non-spam, 1 for spam)
        title (str): Plot title
    """
+   import matplotlib.cm as cm
+   import matplotlib.pyplot as plt
+   import numpy as np
+
    top_words_data = top_words(df, 'v2', top_n=20, label=label)
    
    plt.figure(figsize=(8, 6))
@@ -97,7 +99,7 @@ def main(input_filepath, output_filepath):
    Main function to generate visualizations.
    
    Args:
-       input_filepath (str): Path to input data CSV
+       input_filepath (str): Path to input data (CSV, Parquet or Feather)
        output_filepath (str): Directory to save visualization plots
        
    The function:
@@ -111,7 +113,7 @@ def main(input_filepath, output_filepath):
    params = load_params(params_path)
    
    logger.info(f'Loading data from {input_filepath}')
-   df = pd.read_csv(input_filepath)
+   df = read_frame(input_filepath)
    
    output_path = Path(output_filepath)
    output_path.mkdir(parents=True, exist_ok=True)
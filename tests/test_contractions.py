@@ -0,0 +1,62 @@
+"""Parity of the single-scan contraction expansion with the sequential one."""
+
+import random
+
+import pytest
+
+from src.benchmarks.contractions import make_messages
+from src.data.make_dataset import (
+    contr_words,
+    contr_words_sequential,
+    contractions,
+)
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    "can't",
+    "can't've",
+    "CAN'T Won't y'all'd've",
+    "i'd've said you'll, she's; it's",
+    "'tis 'twas rock'n'roll o'clock",
+    "don't'",
+    "''can't''",
+    "xcan't can'tx can't_ 2can't",
+    "ain't\tisn't\nwasn't",
+])
+def test_edge_cases(text):
+    assert contr_words(text, contractions) == \
+        contr_words_sequential(text, contractions)
+
+
+def test_synthetic_messages():
+    for message in make_messages(2000, seed=0):
+        assert contr_words(message, contractions) == \
+            contr_words_sequential(message, contractions)
+
+
+def test_random_mixed_case_messages():
+    rnd = random.Random(0)
+    keys = list(contractions)
+    alphabet = "ab'_ .,!1"
+    for _ in range(2000):
+        parts = []
+        for _ in range(rnd.randint(1, 6)):
+            if rnd.random() < 0.5:
+                key = rnd.choice(keys)
+                parts.append(''.join(c.upper() if rnd.random() < 0.3 else c
+                                     for c in key))
+            else:
+                parts.append(''.join(rnd.choices(alphabet,
+                                                 k=rnd.randint(1, 5))))
+        message = ''.join(rnd.choice(' \'x') + part for part in parts)
+        assert contr_words(message, contractions) == \
+            contr_words_sequential(message, contractions)
+
+
+def test_other_dictionary():
+    custom = {"c'mon": 'come on', "ma'am": 'madam'}
+    text = "C'mon ma'am, c'mon'"
+    assert contr_words(text, custom) == contr_words_sequential(text, custom)
+    # The engine of one dictionary is not reused for another
+    assert contr_words("can't", custom) == "can't"
@@ -0,0 +1,59 @@
+"""Parity of multi-process pre-processing with the serial run."""
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from src.benchmarks.corpus import make_corpus
+from src.data.make_dataset import main, preprocessing, preprocessing_pool
+from src.data.storage import read_frame
+
+
+@pytest.fixture(scope='module')
+def raw_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('raw') / 'raw.csv'
+    make_corpus(600, seed=8).to_csv(path, index=False)
+    return path
+
+
+def make_dataset(raw_path, output_path, *args):
+    result = CliRunner().invoke(main, [str(raw_path), str(output_path),
+                                       '--tokenizer', 'fast', *args])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.parametrize('chunksize', [None, 97])
+def test_same_csv_bytes(tmp_path, raw_path, chunksize):
+    args = ['--chunksize', str(chunksize)] if chunksize else []
+    make_dataset(raw_path, tmp_path / 'serial.csv', *args)
+    make_dataset(raw_path, tmp_path / 'parallel.csv', '--workers', '3',
+                 *args)
+    assert ((tmp_path / 'parallel.csv').read_bytes()
+            == (tmp_path / 'serial.csv').read_bytes())
+
+
+def test_same_parquet_bytes(tmp_path, raw_path):
+    make_dataset(raw_path, tmp_path / 'serial.parquet')
+    make_dataset(raw_path, tmp_path / 'parallel.parquet', '--workers', '3')
+    assert ((tmp_path / 'parallel.parquet').read_bytes()
+            == (tmp_path / 'serial.parquet').read_bytes())
+
+
+def test_same_feather_frame(tmp_path, raw_path):
+    # Parallel chunks stay separate record batches, so only the frames are
+    # compared
+    make_dataset(raw_path, tmp_path / 'serial.feather')
+    make_dataset(raw_path, tmp_path / 'parallel.feather', '--workers', '3')
+    pd.testing.assert_frame_equal(
+        read_frame(tmp_path / 'parallel.feather'),
+        read_frame(tmp_path / 'serial.feather'), check_exact=True)
+
+
+@pytest.mark.parametrize('n_chunks', [1, 4, 1000])
+def test_same_preprocessed_column(raw_path, n_chunks):
+    df = read_frame(raw_path)[['v1', 'v2']]
+    expected = preprocessing(df.copy(), 'v2', tokenizer='fast')
+    with preprocessing_pool(2, 'fast') as executor:
+        result = preprocessing(df.copy(), 'v2', executor=executor,
+                               n_chunks=n_chunks, tokenizer='fast')
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
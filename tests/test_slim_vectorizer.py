@@ -0,0 +1,55 @@
+"""Parity of the compact TF-IDF artifact with the vectorizer it exports."""
+
+import copy
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.benchmarks.corpus import make_corpus
+from src.features.build_features import make_tfidf_vectorizer
+from src.features.slim_vectorizer import (export_slim_vectorizer,
+                                          load_vectorizer)
+
+CORPUS = make_corpus(300, seed=6)['v2'].tolist()
+# Texts of the corpus plus ones without any vocabulary term
+TEXTS = CORPUS + ['', 'zzz quokka', '!!!']
+
+VECTORIZERS = {
+    'regex': lambda: make_tfidf_vectorizer(50, 'regex'),
+    'pretokenized': lambda: make_tfidf_vectorizer(50, 'pretokenized'),
+    'l1': lambda: TfidfVectorizer(norm='l1'),
+    'no_norm': lambda: TfidfVectorizer(norm=None),
+    'sublinear': lambda: TfidfVectorizer(sublinear_tf=True),
+    'raw_idf': lambda: TfidfVectorizer(smooth_idf=False,
+                                       stop_words='english'),
+}
+
+
+def float32_idf(vectorizer):
+    """Return a copy of `vectorizer` with IDF weights rounded to float32."""
+    rounded = copy.deepcopy(vectorizer)
+    rounded.idf_ = vectorizer.idf_.astype(np.float32).astype(np.float64)
+    return rounded
+
+
+@pytest.mark.parametrize('name', sorted(VECTORIZERS))
+def test_same_matrix(tmp_path, name):
+    vectorizer = VECTORIZERS[name]().fit(CORPUS)
+    path = tmp_path / 'tfidf_vectorizer.npz'
+    export_slim_vectorizer(vectorizer, path)
+
+    X = load_vectorizer(path).transform(TEXTS)
+    expected = float32_idf(vectorizer).transform(TEXTS)
+    X.sort_indices()
+    expected.sort_indices()
+    assert X.shape == expected.shape
+    assert np.array_equal(X.indptr, expected.indptr)
+    assert np.array_equal(X.indices, expected.indices)
+    assert np.array_equal(X.data, expected.data)
+
+
+def test_unsupported_vectorizer(tmp_path):
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2)).fit(CORPUS)
+    with pytest.raises(ValueError):
+        export_slim_vectorizer(vectorizer, tmp_path / 'tfidf_vectorizer.npz')
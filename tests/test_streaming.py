@@ -0,0 +1,58 @@
+"""Parity of the streaming make_dataset mode with the in-memory one."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from src.benchmarks.corpus import make_corpus
+from src.data.make_dataset import DigestSet, main
+from src.data.storage import read_frame
+
+
+@pytest.fixture(scope='module')
+def raw_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('raw') / 'raw.csv'
+    # 5% repeated rows, spread over every chunk
+    make_corpus(600, seed=7).to_csv(path, index=False)
+    return path
+
+
+def make_dataset(raw_path, output_path, *args):
+    result = CliRunner().invoke(main, [str(raw_path), str(output_path),
+                                       '--tokenizer', 'fast', *args])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.parametrize('chunksize', [1, 97, 600, 10000])
+def test_same_csv_bytes(tmp_path, raw_path, chunksize):
+    make_dataset(raw_path, tmp_path / 'in_memory.csv')
+    make_dataset(raw_path, tmp_path / 'streamed.csv',
+                 '--chunksize', str(chunksize))
+    assert ((tmp_path / 'streamed.csv').read_bytes()
+            == (tmp_path / 'in_memory.csv').read_bytes())
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'feather'])
+def test_same_columnar_frame(tmp_path, raw_path, extension):
+    # Streamed files hold one record batch per chunk, so only the frames
+    # are compared
+    make_dataset(raw_path, tmp_path / f'in_memory.{extension}')
+    make_dataset(raw_path, tmp_path / f'streamed.{extension}',
+                 '--chunksize', '97')
+    pd.testing.assert_frame_equal(
+        read_frame(tmp_path / f'streamed.{extension}'),
+        read_frame(tmp_path / f'in_memory.{extension}'), check_exact=True)
+
+
+def test_digest_set_matches_python_set():
+    rng = np.random.default_rng(0)
+    digests, seen = DigestSet(), set()
+    for _ in range(50):
+        batch = rng.integers(0, 500, rng.integers(0, 40), dtype=np.uint64)
+        found = digests.contains(batch)
+        assert found.tolist() == [int(d) in seen for d in batch]
+        new = np.unique(batch[~found])
+        digests.add(new)
+        seen.update(int(d) for d in new)
+    assert len(digests) == len(seen)
@@ -0,0 +1,53 @@
+"""Parity of the map-reduce TF-IDF fit with TfidfVectorizer.fit."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.benchmarks.corpus import make_corpus
+from src.features.build_features import (
+    count_term_frequencies,
+    make_tfidf_vectorizer,
+    tfidf_from_term_counts,
+)
+
+TEXTS = make_corpus(300, seed=3)['v2'].str.lower().tolist()
+
+
+def map_reduce_fit(texts, max_features, analyzer, executor=None, n_shards=1):
+    """Fit the vectorizer from the summed term counts of `n_shards` shards."""
+    term_frequency, document_frequency = count_term_frequencies(
+        texts, executor, n_shards, analyzer)
+    return tfidf_from_term_counts(term_frequency, document_frequency,
+                                  len(texts), max_features=max_features,
+                                  analyzer=analyzer)
+
+
+def assert_same_fit(vectorizer, expected):
+    assert vectorizer.vocabulary_ == expected.vocabulary_
+    assert np.array_equal(vectorizer.idf_, expected.idf_)
+    X, X_expected = vectorizer.transform(TEXTS), expected.transform(TEXTS)
+    assert (X != X_expected).nnz == 0
+
+
+@pytest.mark.parametrize('analyzer', ['regex', 'pretokenized'])
+@pytest.mark.parametrize('max_features', [None, 25, 4000])
+@pytest.mark.parametrize('n_shards', [1, 7])
+def test_serial_fit(analyzer, max_features, n_shards):
+    expected = make_tfidf_vectorizer(max_features, analyzer).fit(TEXTS)
+    assert_same_fit(map_reduce_fit(TEXTS, max_features, analyzer,
+                                   n_shards=n_shards), expected)
+
+
+def test_process_pool_fit():
+    expected = make_tfidf_vectorizer(25).fit(TEXTS)
+    with ProcessPoolExecutor(2) as executor:
+        vectorizer = map_reduce_fit(TEXTS, 25, 'regex', executor=executor,
+                                    n_shards=2)
+    assert_same_fit(vectorizer, expected)
+
+
+def test_empty_vocabulary():
+    with pytest.raises(ValueError, match='empty vocabulary'):
+        map_reduce_fit(['the', 'and of'], None, 'regex')
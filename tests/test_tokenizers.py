@@ -0,0 +1,62 @@
+"""Parity of the fast tokenizer mode with NLTK's word_tokenize."""
+
+import random
+
+import pandas as pd
+import pytest
+from nltk.tokenize import word_tokenize
+
+from src.benchmarks.contractions import make_messages
+from src.benchmarks.tokenizers import EDGE_CASES
+from src.data.make_dataset import fast_tokenize, preprocess_series
+from src.features.build_features import WORD_COUNTERS
+
+# Characters of the seeded random messages: letters the Treebank splits
+# words on, digits, punctuation, underscores, non-ASCII and whitespace
+ALPHABET = 'abcegilmnotw ANT019_.,!?\'"-£éıİß\t\n'
+TREEBANK_WORDS = ['cannot', 'gonna', 'gotta', 'gimme', 'lemme', 'wanna',
+                  'CANNOT', 'Gonna', 'wannabe', 'xcannot']
+
+
+def random_messages(n_messages, seed=0):
+    """Return seeded random messages mixing Treebank-split words and noise."""
+    rnd = random.Random(seed)
+    messages = []
+    for _ in range(n_messages):
+        words = [rnd.choice(TREEBANK_WORDS) if rnd.random() < 0.2
+                 else ''.join(rnd.choices(ALPHABET, k=rnd.randint(1, 8)))
+                 for _ in range(rnd.randint(0, 12))]
+        messages.append(' '.join(words))
+    return messages
+
+
+def clean(messages):
+    """Apply the steps of pre-processing that run before tokenization."""
+    return (pd.Series(messages).str.lower()
+            .str.replace(r'[^\w\s]', '', regex=True))
+
+
+MESSAGES = EDGE_CASES + random_messages(1000) + make_messages(500, seed=1)
+
+
+@pytest.mark.parametrize('text', clean(EDGE_CASES).tolist())
+def test_edge_case_tokens(text):
+    assert fast_tokenize(text) == word_tokenize(text)
+
+
+def test_random_tokens():
+    for text in clean(MESSAGES):
+        assert fast_tokenize(text) == word_tokenize(text)
+
+
+def test_preprocessing_output():
+    series = pd.Series(MESSAGES)
+    processed = preprocess_series(series, tokenizer='nltk')
+    processed_fast = preprocess_series(series, tokenizer='fast')
+    assert processed_fast.tolist() == processed.tolist()
+
+
+def test_word_counts():
+    processed = preprocess_series(pd.Series(MESSAGES), tokenizer='nltk')
+    for text in processed:
+        assert WORD_COUNTERS['fast'](text) == WORD_COUNTERS['nltk'](text)
@@ -0,0 +1,76 @@
+"""Parity of the incremental TF-IDF update with a full refit."""
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from src.benchmarks.corpus import make_corpus
+from src.features.build_features import (
+    TERM_STATS_FILENAME,
+    VECTORIZER_FILENAME,
+    create_sparse_features,
+    load_term_stats,
+    make_tfidf_vectorizer,
+    save_term_stats,
+    tfidf_from_term_counts,
+)
+from src.features.update_vectorizer import main, update_term_stats
+
+CORPUS = make_corpus(300, seed=4)[['v1', 'v2']]
+# New terms, some frequent enough to enter a small vocabulary
+BATCH = (make_corpus(100, seed=5)['v2'].tolist()
+         + ['quokka wombat quokka', 'quokka numbat wombat'] * 20)
+
+
+def fit_saved(df, max_features, analyzer):
+    """Return the vectorizer and term statistics build_features saves."""
+    _, _, _, vectorizer, term_stats = create_sparse_features(
+        df.copy(), max_features=max_features, tokenizer='fast',
+        return_term_stats=True, analyzer=analyzer)
+    return vectorizer, term_stats
+
+
+def assert_same_fit(vectorizer, expected, texts):
+    assert vectorizer.vocabulary_ == expected.vocabulary_
+    assert np.array_equal(vectorizer.idf_, expected.idf_)
+    assert (vectorizer.transform(texts) != expected.transform(texts)).nnz == 0
+
+
+@pytest.mark.parametrize('analyzer', ['regex', 'pretokenized'])
+@pytest.mark.parametrize('max_features', [None, 25])
+def test_update_equals_refit(tmp_path, analyzer, max_features):
+    texts = CORPUS['v2'].tolist() + BATCH
+    refit, refit_stats = fit_saved(pd.DataFrame({'v1': 0, 'v2': texts}),
+                                   max_features, analyzer)
+
+    _, term_stats = fit_saved(CORPUS, max_features, analyzer)
+    save_term_stats(tmp_path / TERM_STATS_FILENAME, term_stats)
+    term_stats = update_term_stats(
+        load_term_stats(tmp_path / TERM_STATS_FILENAME), BATCH,
+        analyzer=analyzer)
+    assert term_stats == refit_stats
+
+    updated = tfidf_from_term_counts(*term_stats, max_features=max_features,
+                                     analyzer=analyzer)
+    assert_same_fit(updated, refit, texts)
+    assert_same_fit(updated,
+                    make_tfidf_vectorizer(max_features, analyzer).fit(texts),
+                    texts)
+
+
+def test_update_command_equals_refit(tmp_path):
+    vectorizer, term_stats = fit_saved(CORPUS, 25, 'regex')
+    joblib.dump(vectorizer, tmp_path / VECTORIZER_FILENAME)
+    save_term_stats(tmp_path / TERM_STATS_FILENAME, term_stats)
+    batch_path = tmp_path / 'batch.csv'
+    pd.DataFrame({'v1': 0, 'v2': BATCH}).to_csv(batch_path, index=False)
+
+    result = CliRunner().invoke(main, [str(tmp_path / VECTORIZER_FILENAME),
+                                       str(batch_path), '--workers', '2'])
+    assert result.exit_code == 0, result.output
+
+    texts = CORPUS['v2'].tolist() + BATCH
+    assert_same_fit(joblib.load(tmp_path / VECTORIZER_FILENAME),
+                    make_tfidf_vectorizer(25).fit(texts), texts)